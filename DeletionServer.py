@@ -1,31 +1,12 @@
 # Save this as server.py and run it
-import pika
-import json
+import logging
 
-class Task:
-    def __init__(self, content, index, belong_week, priority='non-urgent'):
-        self._content = content
-        self._index = index
-        self._belong_week = belong_week
-        self._priority = priority
+import codec
+import metrics
+from server_runner import run_server, parse_server_args
+from task_table import task_table, handle_delete
 
-    def getContent(self):
-        return self._content
-
-    def getIndex(self):
-        return self._index
-
-    def getPriority(self):
-        return self._priority
-
-    def getBelongWeek(self):
-        return self._belong_week
-
-    def setContent(self, content):
-        self._content = content
-
-    def setPriority(self, priority):
-        self._priority = priority
+logger = logging.getLogger('sms.DeletionServer')
 
 def double_check_deletion(userInput):
     if userInput == 'Y':
@@ -35,50 +16,45 @@ def double_check_deletion(userInput):
     else:
         return "Invalid input, try again."
 
-def delete_task(currentTask):
-    currentTask.setContent('')
-    currentTask.setPriority('')
-    return currentTask
-
-def on_request(ch, method, props, body):
+@metrics.timed('rpc_server_seconds', 'DeletionQueue')
+def process_request(body, content_type=None):
     try:
-        print(f"Received body: {body}")
-        request = json.loads(body)
-        print(f"Parsed request: {request}")
+        request = codec.decode(body, content_type)
+        metrics.log_event(logger, logging.DEBUG, 'request', task=request.get('task'), bytes=len(body))
 
         if request['task'] == 'DoubleCheckDeletion':
             userInput = request.get('userInput', None)
             response = double_check_deletion(userInput)
-        elif request['task'] == 'edit_task':
-            task_data = request.get('task_data', {})
-            task = Task(task_data['content'], task_data['index'], task_data['belong_week'], task_data['priority'])
-            response = delete_task(task)
-            response = response.__dict__
+        elif request['task'] == 'delete_task':
+            # Tasks are registered with the EditServer only; this clears the table it shares when hosted with it.
+            response = handle_delete(task_table, request)
         else:
             response = 'Invalid Task'
 
-    except json.JSONDecodeError as e:
-        print(f"JSON decode error: {e}")
-        response = 'Invalid JSON format'
+    except codec.CodecError as e:
+        metrics.increment('rpc_server_errors_total', 'DeletionQueue')
+        metrics.log_event(logger, logging.WARNING, 'decode_error', error=str(e))
+        response = 'Invalid request format'
     except Exception as e:
-        print(f"Unexpected error: {e}")
+        metrics.increment('rpc_server_errors_total', 'DeletionQueue')
+        logger.exception('Unexpected error: %s', e)
         response = 'Error processing request'
 
-    response = json.dumps(response)
+    return codec.encode(response, codec.negotiate(content_type))
+
+def on_request(ch, method, props, body):
+    import pika
+    response = process_request(body, props.content_type)
     ch.basic_publish(exchange='',
                      routing_key=props.reply_to,
-                     properties=pika.BasicProperties(correlation_id=props.correlation_id),
+                     properties=pika.BasicProperties(correlation_id=props.correlation_id,
+                                                     content_type=codec.negotiate(props.content_type)),
                      body=response)
     ch.basic_ack(delivery_tag=method.delivery_tag)
 
-def start_server():
-    connection = pika.BlockingConnection(pika.ConnectionParameters(host='localhost'))
-    channel = connection.channel()
-    channel.queue_declare(queue='DeletionQueue')
-    channel.basic_qos(prefetch_count=1)
-    channel.basic_consume(queue='DeletionQueue', on_message_callback=on_request)
-    print(" [x] Awaiting RPC requests")
-    channel.start_consuming()
+def start_server(workers=1, prefetch_count=1, use_processes=False):
+    run_server('DeletionQueue', on_request, workers, prefetch_count, use_processes)
 
 if __name__ == "__main__":
-    start_server()
+    args = parse_server_args("Runs the DeletionServer microservice.")
+    start_server(args.workers, args.prefetch, args.processes)
@@ -1,32 +1,15 @@
 # Server-side (editServer.py)
-import pika
-import json
-import uuid
-
-class Task:
-    def __init__(self, content, index, belong_week, priority='non-urgent'):
-        self._content = content
-        self._index = index
-        self._belong_week = belong_week
-        self._priority = priority
-
-    def getContent(self):
-        return self._content
-
-    def getIndex(self):
-        return self._index
+import logging
 
-    def getPriority(self):
-        return self._priority
-
-    def getBelongWeek(self):
-        return self._belong_week
+import uuid
 
-    def setContent(self, content):
-        self._content = content
+import codec
+import metrics
+from server_runner import run_server, parse_server_args
+from task import Task
+from task_table import task_table, handle_bulk, handle_delete, handle_put, handle_update, handle_update_where
 
-    def setPriority(self, priority):
-        self._priority = priority
+logger = logging.getLogger('sms.EditServer')
 
 def edit_task(currentTask, inputString):
     currentTask.setContent(inputString)
@@ -36,50 +19,75 @@ def edit_task_priority(currentTask, inputPriorityString):
     currentTask.setPriority(inputPriorityString)
     return currentTask
 
-def on_request(ch, method, props, body):
-    try:
-        request = json.loads(body)
-
-        task_data = request.get('task_data', {})
-        task = Task(task_data['content'], task_data['index'], task_data['belong_week'], task_data['priority'])
-
-        if request['task'] == 'edit_task':
-            new_content = request.get('new_content', '')
-            response = edit_task(task, new_content)
-        elif request['task'] == 'edit_task_priority':
-            new_priority = request.get('new_priority', '')
-            response = edit_task_priority(task, new_priority)
-        else:
-            response = 'Invalid Task'
+def patch_task(currentTask, changes):
+    if 'content' in changes:
+        edit_task(currentTask, changes['content'])
+    if 'priority' in changes:
+        edit_task_priority(currentTask, changes['priority'])
+    return currentTask
 
-        response = response.__dict__  # Convert Task object to dictionary for JSON serialization
+def edit_task_data(request):
+    task_data = request.get('task_data', {})
+    task = Task(task_data['content'], task_data['index'], task_data['belong_week'], task_data['priority'])
+
+    if request['task'] == 'edit_task':
+        new_content = request.get('new_content', '')
+        response = edit_task(task, new_content)
+    elif request['task'] == 'edit_task_priority':
+        new_priority = request.get('new_priority', '')
+        response = edit_task_priority(task, new_priority)
+    else:
+        response = 'Invalid Task'
+
+    return response.toDict()  # Convert Task object to dictionary for JSON serialization
+
+def handle_request(request):
+    changes = request.get('changes', {})
+    if request['task'] == 'put_task':
+        return handle_put(task_table, request)
+    elif request['task'] == 'patch_task':
+        return handle_update(task_table, request, lambda task: patch_task(task, changes))
+    elif request['task'] == 'patch_where':
+        return handle_update_where(task_table, request, lambda task: patch_task(task, changes))
+    elif request['task'] == 'bulk':
+        return handle_bulk(request, handle_request)
+    elif request['task'] == 'delete_task':
+        return handle_delete(task_table, request)
+    else:
+        return edit_task_data(request)
+
+@metrics.timed('rpc_server_seconds', 'EditQueue')
+def process_request(body, content_type=None):
+    try:
+        request = codec.decode(body, content_type)
+        response = handle_request(request)
 
-    except json.JSONDecodeError as e:
-        print(f"JSON decode error: {e}")
-        response = 'Invalid JSON format'
+    except codec.CodecError as e:
+        metrics.increment('rpc_server_errors_total', 'EditQueue')
+        metrics.log_event(logger, logging.WARNING, 'decode_error', error=str(e))
+        response = 'Invalid request format'
 
     except Exception as e:
-        print(f"Unexpected error: {e}")
+        metrics.increment('rpc_server_errors_total', 'EditQueue')
+        logger.exception('Unexpected error: %s', e)
         response = 'Error processing request'
 
-    response = json.dumps(response)
+    return codec.encode(response, codec.negotiate(content_type))
+
+def on_request(ch, method, props, body):
+    import pika
+    response = process_request(body, props.content_type)
     ch.basic_publish(exchange='',
                      routing_key=props.reply_to,
-                     properties=pika.BasicProperties(correlation_id=props.correlation_id),
+                     properties=pika.BasicProperties(correlation_id=props.correlation_id,
+                                                     content_type=codec.negotiate(props.content_type)),
                      body=response)
 
     ch.basic_ack(delivery_tag=method.delivery_tag)
 
-def start_server():
-    connection = pika.BlockingConnection(pika.ConnectionParameters(host='localhost'))
-    channel = connection.channel()
-
-    channel.queue_declare(queue='EditQueue')
-    channel.basic_qos(prefetch_count=1)
-    channel.basic_consume(queue='EditQueue', on_message_callback=on_request)
-
-    print(" [x] Awaiting RPC requests")
-    channel.start_consuming()
+def start_server(workers=1, prefetch_count=1, use_processes=False):
+    run_server('EditQueue', on_request, workers, prefetch_count, use_processes, stateful=True)
 
 if __name__ == "__main__":
-    start_server()
+    args = parse_server_args("Runs the EditServer microservice.", stateful=True)
+    start_server(args.workers, args.prefetch, args.processes)
@@ -1,26 +1,60 @@
-import pika
-import sys
+import logging
 
+import metrics
+from server_runner import broadcast_shutdown, measure_queue_wait
 
-def quit_callback(ch, method, props, body):
-    """Callback function to handle quit messages."""
+logger = logging.getLogger('sms.QuitServer')
+
+
+def quit_response(message):
+    """Returns the reply for a quit message: 'Y' shuts down, 'N' continues."""
+    if message == 'Y':
+        return "Server is shutting down"
+    elif message == 'N':
+        return "Server is continuing"
+    else:
+        return "Invalid input"
+
+
+def shutdown_report(acks, missing):
+    """Returns the reply for a completed shutdown broadcast, with the slowest drain time."""
+    drain = max((ack['drain_seconds'] for ack in acks), default=0.0)
+    report = f"Server is shutting down ({len(acks)} workers drained in {drain * 1000:.1f} ms"
+    if missing:
+        report += f"; no answer from {', '.join(missing)}"
+    return report + ")"
+
+
+@metrics.timed('rpc_server_seconds', 'QuitQueue')
+def process_request(body, content_type=None):
+    """Returns the reply body for a raw quit message without any broker side effects.
+    Quit messages are plain strings, so content_type is ignored."""
+    return quit_response(body.decode() if isinstance(body, bytes) else body)
+
+
+@metrics.timed('rpc_server_seconds', 'QuitQueue')
+def quit_callback(ch, method, props, body, shutdown=broadcast_shutdown):
+    """Callback function to handle quit messages.
+    shutdown stops the services and returns their acknowledgements and the services that did not answer."""
+    import pika
     message = body.decode()
     if message == 'Y':
-        print("Exiting program...")
-        ch.basic_ack(delivery_tag=method.delivery_tag)
-        response = "Server is shutting down"
+        logger.info("Draining services...")
+        acks, missing = shutdown()
+        for ack in acks:
+            logger.info("%s worker %s drained in %.3f s", ack['queue'], ack['worker'], ack['drain_seconds'])
         ch.basic_publish(
             exchange='',
             routing_key=props.reply_to,
             properties=pika.BasicProperties(correlation_id=props.correlation_id),
-            body=response
+            body=shutdown_report(acks, missing)
         )
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+        logger.info("Exiting program...")
         ch.stop_consuming()
-        ch.connection.close()
-        sys.exit()
     elif message == 'N':
-        print("Continuing operation...")
-        response = "Server is continuing"
+        logger.info("Continuing operation...")
+        response = quit_response(message)
         ch.basic_publish(
             exchange='',
             routing_key=props.reply_to,
@@ -29,8 +63,8 @@ def quit_callback(ch, method, props, body):
         )
         ch.basic_ack(delivery_tag=method.delivery_tag)
     else:
-        print("Invalid input received, ignoring...")
-        response = "Invalid input"
+        logger.info("Invalid input received, ignoring...")
+        response = quit_response(message)
         ch.basic_publish(
             exchange='',
             routing_key=props.reply_to,
@@ -41,15 +75,19 @@ def quit_callback(ch, method, props, body):
 
 def start_quit_server():
     """Function to start the QuitServer."""
+    import pika
+    metrics.configure_logging()
+    metrics.start_from_env()
     connection = pika.BlockingConnection(pika.ConnectionParameters(host='localhost'))
     channel = connection.channel()
 
     channel.queue_declare(queue='QuitQueue')
 
-    channel.basic_consume(queue='QuitQueue', on_message_callback=quit_callback)
+    channel.basic_consume(queue='QuitQueue', on_message_callback=measure_queue_wait('QuitQueue', quit_callback))
 
     print('Waiting for quit messages...')
     channel.start_consuming()
+    connection.close()
 
 if __name__ == "__main__":
     start_quit_server()
\ No newline at end of file
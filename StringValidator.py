@@ -1,37 +1,73 @@
-import pika
-import json
+import logging
 
-connection = pika.BlockingConnection(pika.ConnectionParameters(host='localhost'))
-channel = connection.channel()
+import codec
+import metrics
+from server_runner import run_server, parse_server_args
+from validation import validate_string
 
-channel.queue_declare(queue='StringValidation')
+logger = logging.getLogger('sms.StringValidator')
+
+
+def validate_request(real_body):
+    """Validates one decoded request body.
+
+    A single request is a list [User's String, Lower Bound, Upper Bound] and returns one result.
+    A batch request is either {"batch": [[string, lower, upper], ...]} or
+    {"lower": lower, "upper": upper, "strings": [string, ...]} and returns a list of results
+    in the same order."""
+    if isinstance(real_body, dict):
+        if 'batch' in real_body:
+            return [validate_string(item[0], item[1], item[2]) for item in real_body['batch']]
+        string_lower = real_body['lower']
+        string_upper = real_body['upper']
+        return [validate_string(user_string, string_lower, string_upper) for user_string in real_body['strings']]
+    return validate_string(real_body[0], real_body[1], real_body[2])
+
+
+@metrics.timed('rpc_server_seconds', 'StringValidation')
+def process_request(body, content_type=None):
+    """Decodes a request body, validates it and returns the reply encoded in the negotiated
+    content type (see codec), JSON for requests without one."""
+    reply_type = codec.negotiate(content_type)
+    try:
+        real_body = codec.decode(body, content_type)
+        response = validate_request(real_body)
+    except codec.CodecError as e:
+        metrics.increment('rpc_server_errors_total', 'StringValidation')
+        metrics.log_event(logger, logging.WARNING, 'decode_error', error=str(e))
+        response = "Invalid request format"
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        # A body that decodes but is not one of the request shapes of validate_request.
+        metrics.increment('rpc_server_errors_total', 'StringValidation')
+        metrics.log_event(logger, logging.WARNING, 'malformed_request', error=repr(e))
+        response = "Invalid request format"
+    except Exception as e:
+        metrics.increment('rpc_server_errors_total', 'StringValidation')
+        logger.exception('Unexpected error: %s', e)
+        response = "Error processing request"
+    return codec.encode(response, reply_type)
 
 
 def callback(ch, method, props, body):
     """Microservice function that receives a list with [User's String, Lower Bound
     of acceptable string length, Upper Bound of acceptable string length] and returns
-    whether the string is valid or invalid."""
-    real_body = json.loads(body)
-    user_string = real_body[0]
-    string_lower = real_body[1]
-    string_upper = real_body[2]
-    count = 0
-    for char in user_string:
-        count += 1
-    if count <= string_lower:
-        resp = "Too Small"
-    elif count >= string_upper:
-        resp = "Too Big"
-    else:
-        resp = "Just Right"
-    response = json.dumps(resp)
+    whether the string is valid or invalid. Batch requests (see validate_request)
+    return a list of results in one reply."""
+    import pika
+    response = process_request(body, props.content_type)
     ch.basic_publish(exchange='',
                      routing_key=props.reply_to,
-                     properties=pika.BasicProperties(correlation_id=props.correlation_id),
-                     body=str(response))
+                     properties=pika.BasicProperties(correlation_id=props.correlation_id,
+                                                     content_type=codec.negotiate(props.content_type)),
+                     body=response)
     ch.basic_ack(delivery_tag=method.delivery_tag)
 
 
-channel.basic_consume(queue='StringValidation', on_message_callback=callback)
-print('Waiting for messages...')
-channel.start_consuming()
+def start_server(workers=1, prefetch_count=1, use_processes=False):
+    """Starts the StringValidator consumers on the StringValidation queue."""
+    run_server('StringValidation', callback, workers, prefetch_count, use_processes)
+
+
+if __name__ == "__main__":
+    args = parse_server_args("Runs the StringValidator microservice.")
+    start_server(args.workers, args.prefetch, args.processes)
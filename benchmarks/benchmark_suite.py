@@ -0,0 +1,195 @@
+"""
+Runs every RPC round trip and local hot path benchmark and writes the results as JSON.
+
+RPC benchmarks call StringValidator, EditServer, DeletionServer and
+QuitServer through the in-process transport unless --transport amqp is given,
+in which case the services and RabbitMQ must be running. Local benchmarks
+render daily schedules and convert tasks at each --sizes tasks per day;
+their ops_per_s counts tasks, not calls.
+Pass --compare with an earlier results file to print the change of every
+metric, so runs from different commits can be compared.
+
+Usage:
+    python benchmarks/benchmark_suite.py [--output results.json] [--compare baseline.json]
+                                         [--transport inprocess] [--rounds 2000] [--sizes 10,1000,100000]
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Requests pipelined together by the throughput measurements of the RPC benchmarks.
+PIPELINE_DEPTH = 100
+
+
+def percentile(sorted_samples, fraction):
+    return sorted_samples[min(len(sorted_samples) - 1, int(fraction * len(sorted_samples)))]
+
+
+def summarize(samples, operations=1):
+    """
+    Returns latency percentiles in microseconds and throughput for per-call samples in seconds.
+    """
+    ordered = sorted(samples)
+    total = sum(ordered)
+    return {
+        'calls': len(ordered),
+        'p50_us': percentile(ordered, 0.50) * 1e6,
+        'p90_us': percentile(ordered, 0.90) * 1e6,
+        'p99_us': percentile(ordered, 0.99) * 1e6,
+        'max_us': ordered[-1] * 1e6,
+        'ops_per_s': len(ordered) * operations / total if total else 0.0,
+    }
+
+
+def measure(function, rounds, warmup=10):
+    for _ in range(min(warmup, rounds)):
+        function()
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def rpc_benchmarks(ui, rounds):
+    """
+    Measures single-call latency and pipelined throughput of every service round trip.
+    """
+    from rpc import RpcClient
+    from codec import default_content_type
+
+    validator = RpcClient('StringValidation', content_type=default_content_type())
+    quit_client = RpcClient('QuitQueue')
+    deletion = ui.DeletionClient()
+    editor = ui.EditClient()
+    task = ui.Task('benchmark task', 1, 'Monday', 'non-urgent', task_id=10 ** 9)
+    editor.put_task(task)
+    priorities = ['urgent', 'non-urgent']
+    counter = iter(range(10 ** 12))
+
+    requests = {
+        'StringValidator.validate': (validator, lambda: ['benchmark task', 0, 40]),
+        'EditServer.patch_task': (editor, lambda: {'task': 'patch_task', 'task_id': task.getId(),
+                                                   'changes': {'priority': priorities[next(counter) % 2]}}),
+        'DeletionServer.double_check': (deletion, lambda: {'task': 'DoubleCheckDeletion', 'userInput': 'N'}),
+        'QuitServer.continue': (quit_client, lambda: 'N'),
+    }
+    results = {}
+    for name, (client, build) in requests.items():
+        latency = summarize(measure(lambda: client.send(build()).result(), rounds))
+        batches = max(1, rounds // PIPELINE_DEPTH)
+        pipelined = summarize(measure(lambda: client.call_many([build() for _ in range(PIPELINE_DEPTH)]), batches),
+                              PIPELINE_DEPTH)
+        latency['pipelined_ops_per_s'] = pipelined['ops_per_s']
+        results[name] = latency
+    return results
+
+
+def local_benchmarks(ui, sizes, rounds):
+    """
+    Measures schedule rendering and task conversion at each number of tasks per day.
+    """
+    from task import task_to_dict, dict_to_task
+
+    store = ui.get_task_store()
+    results = {}
+    for day, size in zip(range(len(ui.WEEK_DAYS)), sizes):
+        date = ui.WEEK_DAYS[day]
+        for number in range(size):
+            store.append(day, ui.Task('task number ' + str(number), number + 1, date,
+                                             'urgent' if number % 3 else 'non-urgent'))
+        tasks = store.tasks_for_day(day)
+        dicts = [task.toDict() for task in tasks]
+        repeat = max(3, min(rounds, 200000 // size))
+        results[f'render.uncached[{size}]'] = summarize(
+            measure(lambda: ui.RenderDailySchedule(day, 'A'), repeat, warmup=1), size)
+        results[f'render.cached[{size}]'] = summarize(
+            measure(lambda: ui.DisplayDailySchedule(date, 'A'), repeat, warmup=1), size)
+        results[f'task_to_dict[{size}]'] = summarize(
+            measure(lambda: [task_to_dict(task) for task in tasks], repeat, warmup=1), size)
+        results[f'dict_to_task[{size}]'] = summarize(
+            measure(lambda: [dict_to_task(data) for data in dicts], repeat, warmup=1), size)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """
+    Prints the change of every metric shared with a baseline results file.
+    """
+    with open(baseline_path, encoding='utf-8') as baseline_file:
+        baseline = json.load(baseline_file)
+    print(f"\nchange against {baseline_path} (commit {baseline.get('commit')}):")
+    print(f"{'benchmark':>36} {'metric':>20} {'before':>12} {'after':>12} {'change':>8}")
+    for name, metrics in results['benchmarks'].items():
+        before_metrics = baseline.get('benchmarks', {}).get(name)
+        if before_metrics is None:
+            continue
+        for metric in ('p50_us', 'p99_us', 'ops_per_s', 'pipelined_ops_per_s'):
+            if metric in metrics and before_metrics.get(metric):
+                before, after = before_metrics[metric], metrics[metric]
+                print(f"{name:>36} {metric:>20} {before:>12.2f} {after:>12.2f} {(after / before - 1) * 100:>7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--compare', metavar='BASELINE', help='results file of an earlier run to compare against')
+    parser.add_argument('--transport', default='inprocess', choices=['inprocess', 'amqp'])
+    parser.add_argument('--rounds', type=int, default=2000, help='calls per RPC benchmark')
+    parser.add_argument('--sizes', default='10,1000,100000', help='tasks per day for the local benchmarks')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+    if len(sizes) > 7:
+        parser.error('at most seven sizes, one per day')
+
+    os.environ['SMS_TRANSPORT'] = args.transport
+    os.environ['SMS_DATA_DIR'] = tempfile.mkdtemp(prefix='sms-suite-')
+    import main as ui  # noqa: E402
+
+    # Keep service logging and rendered schedules out of the report and the timings.
+    real_stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+        benchmarks = rpc_benchmarks(ui, args.rounds)
+        benchmarks.update(local_benchmarks(ui, sizes, args.rounds))
+    finally:
+        sys.stdout = real_stdout
+
+    results = {
+        'commit': git_commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'transport': args.transport,
+        'benchmarks': benchmarks,
+    }
+    with open(args.output, 'w', encoding='utf-8') as output:
+        json.dump(results, output, indent=2)
+
+    print(f"{'benchmark':>36} {'p50 us':>10} {'p99 us':>10} {'ops/s':>14}")
+    for name, metrics in benchmarks.items():
+        print(f"{name:>36} {metrics['p50_us']:>10.2f} {metrics['p99_us']:>10.2f} {metrics['ops_per_s']:>14,.0f}")
+    print(f"results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
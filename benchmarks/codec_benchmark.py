@@ -0,0 +1,50 @@
+"""
+Compares encode/decode time and bytes on the wire for the JSON and binary wire formats.
+
+Usage:
+    python benchmarks/codec_benchmark.py [--repeat 20000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import codec  # noqa: E402
+
+TASK_DATA = {'content': 'Finish the report', 'index': 3, 'belong_week': 'Monday', 'priority': 'urgent'}
+
+PAYLOADS = {
+    'edit request': {'task': 'edit_task', 'task_data': TASK_DATA, 'new_content': 'Finish the final report'},
+    'task reply': {'_content': 'Finish the report', '_index': 3, '_belong_week': 'Monday', '_priority': 'urgent'},
+    'validation': ['Finish the report', 0, 40],
+    'validation x100': {'lower': 0, 'upper': 40, 'strings': ['task number ' + str(i) for i in range(100)]},
+}
+
+
+def time_per_call(function, argument, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(argument)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'payload':>16} {'format':>7} {'bytes':>7} {'encode us':>10} {'decode us':>10}")
+    for name, payload in PAYLOADS.items():
+        for label, content_type in (('json', codec.JSON), ('binary', codec.BINARY)):
+            body = codec.encode(payload, content_type)
+            assert codec.decode(body, content_type) == payload
+            encode_time = time_per_call(lambda value: codec.encode(value, content_type), payload, args.repeat)
+            decode_time = time_per_call(lambda value: codec.decode(value, content_type), body, args.repeat)
+            size = len(body.encode('utf-8') if isinstance(body, str) else body)
+            print(f"{name:>16} {label:>7} {size:>7} {encode_time * 1e6:>10.2f} {decode_time * 1e6:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Measures the cost of redrawing a large daily schedule with and without the rendered-view cache.
+
+The urgent-first rows compare the priority-indexed view with sorting the day on every draw.
+
+Usage:
+    python benchmarks/schedule_render_benchmark.py [--tasks 5000] [--repeat 200]
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def time_per_redraw(function, repeat):
+    real_stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function()
+            sys.stdout.seek(0)
+            sys.stdout.truncate()
+        return (time.perf_counter() - start) / repeat
+    finally:
+        sys.stdout = real_stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ['SMS_DATA_DIR'] = tempfile.mkdtemp(prefix='sms-render-')
+    import main as ui  # noqa: E402
+
+    store = ui.get_task_store()
+    day = ui.WEEK_DAYS.index('Saturday')
+    for number in range(args.tasks):
+        store.append(day, ui.Task('task number ' + str(number), number + 1, 'Saturday',
+                                         'urgent' if number % 3 else 'non-urgent'))
+
+    def changed_redraw():
+        store.set_priority(day, 0, 'urgent')
+        ui.DisplayDailySchedule('Saturday', 'A')
+
+    def changed_urgent_first():
+        store.set_priority(day, 0, 'urgent')
+        ui.DisplayDailySchedule('Saturday', 'A', urgentFirst=True)
+
+    def sorted_urgent_first():
+        # What an urgent-first view costs when the day is sorted on every draw instead of indexed.
+        tasks = sorted(enumerate(store.tasks_for_day(day), 1), key=lambda item: item[1].getPriority() != 'urgent')
+        sys.stdout.write('\n'.join(f"{number}. {task.getContent()} Priority: {task.getPriority()}"
+                                    for number, task in tasks))
+
+    print(f"{'redraw':>14} {'ms':>10}  ({args.tasks} tasks)")
+    print(f"{'changed':>14} {time_per_redraw(changed_redraw, args.repeat) * 1e3:>10.3f}")
+    unchanged = time_per_redraw(lambda: ui.DisplayDailySchedule('Saturday', 'A'), args.repeat)
+    print(f"{'unchanged':>14} {unchanged * 1e3:>10.3f}")
+    print(f"{'urgent first':>14} {time_per_redraw(changed_urgent_first, args.repeat) * 1e3:>10.3f}")
+    print(f"{'sorted':>14} {time_per_redraw(sorted_urgent_first, args.repeat) * 1e3:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
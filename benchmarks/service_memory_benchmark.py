@@ -0,0 +1,96 @@
+"""
+Compares the resident memory and broker connections of four service processes with one service_host.py.
+
+Every process is measured once it has answered a first request: with
+--transport amqp (the default) the real scripts are started and sent a
+request through RabbitMQ, so their connections are open; with --transport
+inprocess each interpreter imports its modules and calls the handlers
+directly, which needs no broker but leaves the connection buffers out.
+Resident memory is read from /proc, so this runs on Linux only.
+
+Usage:
+    python benchmarks/service_memory_benchmark.py [--transport amqp]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from startup_benchmark import SERVICES  # noqa: E402
+
+
+def resident_kib(pid):
+    """
+    Returns the resident set size of a process in KiB.
+    """
+    with open(f'/proc/{pid}/status', encoding='ascii') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    raise RuntimeError(f'no VmRSS for process {pid}')
+
+
+def start_inprocess(module, services):
+    """
+    Starts an interpreter that imports a module, answers one request per service and waits.
+    """
+    calls = ''.join(f"import {name}; {name}.process_request({SERVICES[name][2].encode()!r}, {SERVICES[name][3]!r}); "
+                    for name in services)
+    code = (f"import sys; sys.path.insert(0, {ROOT!r}); import {module}; "
+            f"{calls}print('ready', flush=True); sys.stdin.read()")
+    process = subprocess.Popen([sys.executable, '-c', code], cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    if process.stdout.readline().strip() != b'ready':
+        raise RuntimeError(f'{module} did not start')
+    return process
+
+
+def start_amqp(script, queues):
+    """
+    Starts a service script and returns once each of its queues has answered a request.
+    """
+    from rpc import AmqpTransport, get_pool
+
+    pool = get_pool().acquire()
+    for queue in queues:
+        pool.channel.queue_declare(queue=queue)
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, script)], cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    transport = AmqpTransport(pool)
+    for _, queue, body, content_type in SERVICES.values():
+        if queue in queues:
+            transport.send(queue, body.encode(), None, content_type).result(timeout=30.0)
+    return process
+
+
+def measure(processes):
+    try:
+        return [resident_kib(process.pid) for process in processes]
+    finally:
+        for process in processes:
+            process.kill()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--transport', default='amqp', choices=['amqp', 'inprocess'])
+    args = parser.parse_args()
+
+    if args.transport == 'amqp':
+        separate = measure([start_amqp(script, [queue]) for script, queue, _, _ in SERVICES.values()])
+        hosted = measure([start_amqp('service_host.py', [queue for _, queue, _, _ in SERVICES.values()])])
+    else:
+        separate = measure([start_inprocess(name, [name]) for name in SERVICES])
+        hosted = measure([start_inprocess('service_host', list(SERVICES))])
+
+    print(f"{'layout':>16} {'processes':>10} {'connections':>12} {'RSS MiB':>10}  ({args.transport})")
+    connections = len(SERVICES) if args.transport == 'amqp' else 0
+    print(f"{'separate':>16} {len(separate):>10} {connections:>12} {sum(separate) / 1024:>10.1f}")
+    print(f"{'service_host':>16} {len(hosted):>10} {min(connections, 1):>12} {sum(hosted) / 1024:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
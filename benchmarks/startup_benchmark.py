@@ -0,0 +1,119 @@
+"""
+Measures time-to-first-prompt of main.py and time-to-ready of every service in fresh interpreters.
+
+main.py is started with its stdin on a pipe and timed until it asks for the
+first input. A service counts as ready once it has answered a first request:
+with --transport amqp (the default) the service is started through its
+script and the request waits in its RabbitMQ queue, so the time includes
+connecting and declaring the queue; with --transport inprocess a fresh
+interpreter imports the service module and calls its handler once, which
+needs no broker. Every measurement is repeated and the median is reported,
+next to the start-up time of a bare interpreter.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--transport amqp] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FIRST_PROMPT = b"[Enter/Q]: "
+
+# Script, queue, request body and content type of the first request sent to each service.
+SERVICES = {
+    'StringValidator': ('StringValidator.py', 'StringValidation', json.dumps(['startup', 0, 40]), 'application/json'),
+    'EditServer': ('EditServer.py', 'EditQueue', json.dumps({'task': 'patch_task', 'task_id': -1, 'changes': {}}),
+                   'application/json'),
+    'DeletionServer': ('DeletionServer.py', 'DeletionQueue',
+                       json.dumps({'task': 'DoubleCheckDeletion', 'userInput': 'N'}), 'application/json'),
+    'QuitServer': ('QuitServer.py', 'QuitQueue', 'N', None),
+}
+
+
+def time_interpreter():
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'], check=True)
+    return time.perf_counter() - start
+
+
+def time_first_prompt():
+    """
+    Starts main.py on an empty data directory and returns the seconds until it prompts for input.
+    """
+    env = dict(os.environ, SMS_DATA_DIR=tempfile.mkdtemp(prefix='sms-startup-'))
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'main.py')], cwd=ROOT, env=env,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    output = b''
+    try:
+        while FIRST_PROMPT not in output:
+            chunk = process.stdout.read1(4096)
+            if not chunk:
+                raise RuntimeError('main.py exited before its first prompt')
+            output += chunk
+        return time.perf_counter() - start
+    finally:
+        process.kill()
+        process.wait()
+
+
+def time_ready_inprocess(name):
+    """
+    Returns the seconds a fresh interpreter takes to import a service and answer one request.
+    """
+    script, _, body, content_type = SERVICES[name]
+    module = script[:-len('.py')]
+    code = (f"import sys; sys.path.insert(0, {ROOT!r}); import {module}; "
+            f"{module}.process_request({body.encode()!r}, {content_type!r})")
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def time_ready_amqp(name):
+    """
+    Starts a service and returns the seconds until it answers a request queued before it started.
+    """
+    from rpc import AmqpTransport, get_pool
+
+    script, queue, body, content_type = SERVICES[name]
+    pool = get_pool().acquire()
+    pool.channel.queue_declare(queue=queue)
+    pool.channel.queue_purge(queue=queue)
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, script)], cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        AmqpTransport(pool).send(queue, body.encode(), None, content_type).result(timeout=30.0)
+        return time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--transport', default='amqp', choices=['amqp', 'inprocess'])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    time_ready = time_ready_amqp if args.transport == 'amqp' else time_ready_inprocess
+    rows = [('python -c pass', time_interpreter), ('main.py first prompt', time_first_prompt)]
+    rows += [(f'{name} ready', lambda name=name: time_ready(name)) for name in SERVICES]
+
+    print(f"{'startup':>26} {'median ms':>10} {'min ms':>10}  ({args.transport}, {args.repeat} runs)")
+    for label, measure in rows:
+        samples = [measure() for _ in range(args.repeat)]
+        print(f"{label:>26} {statistics.median(samples) * 1e3:>10.1f} {min(samples) * 1e3:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Measures memory per task for the old dict-backed Task, the __slots__ Task and WeekColumns.
+
+Usage:
+    python benchmarks/task_memory_benchmark.py [--tasks 100000]
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from task import Task, WeekColumns, WEEK_DAYS  # noqa: E402
+
+
+class DictTask:
+    """The Task layout before __slots__: one instance __dict__ per task."""
+
+    def __init__(self, content, index, belong_week, priority='non-urgent'):
+        self._content = content
+        self._index = index
+        self._belong_week = belong_week
+        self._priority = priority
+
+
+def make_rows(amount):
+    # Contents repeat every 50 tasks, as recurring tasks do in a real schedule.
+    return [('task number ' + str(i % 50), i // 7 + 1, i % 7, 'urgent' if i % 3 == 0 else 'non-urgent')
+            for i in range(amount)]
+
+
+def build_objects(task_class, rows):
+    return [task_class(content, index, WEEK_DAYS[day], priority) for content, index, day, priority in rows]
+
+
+def build_columns(rows):
+    columns = WeekColumns()
+    for content, index, day, priority in rows:
+        columns.append(content, index, day, priority)
+    return columns
+
+
+def measure(build, rows):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build(rows)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=100000)
+    args = parser.parse_args()
+
+    rows = make_rows(args.tasks)
+    results = [
+        ('dict Task', measure(lambda r: build_objects(DictTask, r), rows)),
+        ('slots Task', measure(lambda r: build_objects(Task, r), rows)),
+        ('WeekColumns', measure(build_columns, rows)),
+    ]
+    for name, total in results:
+        print(f"{name:>12}: {total / 1024:10.1f} KiB total | {total / args.tasks:7.1f} bytes/task")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Drives the UI page state machine with a long scripted session and reports stack depth and memory.
+
+The session walks the schedule pages over and over: switching days, opening a
+task and going back, visiting the mail and tutorial pages and typing invalid
+input. No command adds or edits tasks, so no RPC service is needed. Stack
+depth and traced memory are sampled as the session runs and should stay flat.
+
+Usage:
+    python benchmarks/ui_soak_benchmark.py [--commands 1000000] [--samples 10]
+"""
+import argparse
+import builtins
+import io
+import itertools
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Navigation repeated for the whole session, starting from the daily schedule page.
+COMMAND_CYCLE = ['Tuesday', '1', 'back', '2', 'B', 'Monday', 'mail', 'back', 'Sunday',
+                 'tutorial', 'Back', 'Tuesday', '3', 'back', 'oops', '99', 'Friday']
+
+# Commands that get from the first page to the daily schedule page.
+OPENING_COMMANDS = ['', '', 'A', 'Monday']
+
+
+class SessionFinished(Exception):
+    """
+    Raised by the scripted input once every command has been typed.
+    """
+
+
+class NullWriter(io.TextIOBase):
+    """
+    Text stream that discards everything written to it.
+    """
+
+    def write(self, text):
+        return len(text)
+
+
+def stack_depth():
+    frame = sys._getframe()
+    depth = 0
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--commands', type=int, default=1000000)
+    parser.add_argument('--samples', type=int, default=10)
+    args = parser.parse_args()
+
+    os.environ['SMS_DATA_DIR'] = tempfile.mkdtemp(prefix='sms-soak-')
+    import main as ui  # noqa: E402
+
+    commands = itertools.chain(OPENING_COMMANDS, itertools.islice(itertools.cycle(COMMAND_CYCLE), args.commands))
+    sample_every = max(1, args.commands // args.samples)
+    samples = []
+    typed = 0
+
+    def scripted_input(prompt=''):
+        nonlocal typed
+        typed += 1
+        if typed % sample_every == 0:
+            samples.append((typed, stack_depth(), tracemalloc.get_traced_memory()[0]))
+        try:
+            return next(commands)
+        except StopIteration:
+            raise SessionFinished() from None
+
+    real_input, real_stdout = builtins.input, sys.stdout
+    builtins.input, sys.stdout = scripted_input, NullWriter()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        ui.RunPages(ui.Session(), ui.FEATURE_NEW_EXTENSIONS_PAGE)
+    except SessionFinished:
+        pass
+    finally:
+        elapsed = time.perf_counter() - start
+        tracemalloc.stop()
+        builtins.input, sys.stdout = real_input, real_stdout
+
+    print(f"{'commands':>10} {'stack depth':>12} {'traced KiB':>11}")
+    for count, depth, memory in samples:
+        print(f"{count:>10} {depth:>12} {memory / 1024:>11.1f}")
+    print(f"{typed - 1} commands in {elapsed:.2f} s ({(typed - 1) / elapsed:,.0f} commands/s)")
+
+
+if __name__ == '__main__':
+    main()
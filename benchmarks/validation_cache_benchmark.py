@@ -0,0 +1,52 @@
+"""
+Measures StringValidatorClient latency for uncached, cached and local validations.
+
+The uncached calls go to the StringValidator through the transport chosen by
+SMS_TRANSPORT, so either run the service or set SMS_TRANSPORT=inprocess.
+
+Usage:
+    python benchmarks/validation_cache_benchmark.py [--repeat 100000] [--distinct 500]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def time_per_call(function, requests, repeat):
+    start = time.perf_counter()
+    for position in range(repeat):
+        function(requests[position % len(requests)])
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=100000)
+    parser.add_argument('--distinct', type=int, default=500, help='number of different strings validated')
+    args = parser.parse_args()
+
+    os.environ.setdefault('SMS_DATA_DIR', tempfile.mkdtemp(prefix='sms-validation-'))
+    from main import StringValidatorClient  # noqa: E402
+
+    requests = [['task number ' + str(i), 0, 40] for i in range(args.distinct)]
+    remote = StringValidatorClient(local=False)
+    local = StringValidatorClient(local=True)
+
+    StringValidatorClient.cache.clear()
+    uncached = time_per_call(remote.call, requests, len(requests))
+    cached = time_per_call(remote.call, requests, args.repeat)
+    in_process = time_per_call(local.call, requests, args.repeat)
+
+    print(f"{'path':>10} {'us/call':>10}")
+    print(f"{'uncached':>10} {uncached * 1e6:>10.3f}")
+    print(f"{'cached':>10} {cached * 1e6:>10.3f}")
+    print(f"{'local':>10} {in_process * 1e6:>10.3f}")
+    print(f"cache: {StringValidatorClient.cache.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Compares single and batch requests against a running StringValidator service.
+
+Usage:
+    python benchmarks/validator_batch_benchmark.py [--items 1000] [--batch-size 100]
+
+Requires RabbitMQ on localhost and StringValidator.py consuming the
+StringValidation queue.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rpc import RpcClient  # noqa: E402
+
+
+def make_strings(amount):
+    return ['task number ' + str(i) for i in range(amount)]
+
+
+def run_single(client, strings, lower, upper):
+    start = time.perf_counter()
+    for user_string in strings:
+        client.call([user_string, lower, upper])
+    elapsed = time.perf_counter() - start
+    return len(strings), elapsed
+
+
+def run_batch(client, strings, lower, upper, batch_size):
+    start = time.perf_counter()
+    messages = 0
+    for offset in range(0, len(strings), batch_size):
+        client.call({'lower': lower, 'upper': upper, 'strings': strings[offset:offset + batch_size]})
+        messages += 1
+    elapsed = time.perf_counter() - start
+    return messages, elapsed
+
+
+def report(mode, messages, items, elapsed):
+    print(f"{mode:>6}: {messages} messages, {items} items in {elapsed:.3f}s | "
+          f"{messages / elapsed:.1f} msg/s | {items / elapsed:.1f} items/s | "
+          f"{elapsed / items * 1e6:.1f} us/item")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+
+    client = RpcClient('StringValidation', encode=json.dumps, decode=json.loads)
+    strings = make_strings(args.items)
+
+    messages, elapsed = run_single(client, strings, 0, 40)
+    report('single', messages, len(strings), elapsed)
+    messages, elapsed = run_batch(client, strings, 0, 40, args.batch_size)
+    report('batch', messages, len(strings), elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import codec
+
+
+class CompletedFuture:
+    """
+    Future for a reply that is already available, mirroring rpc.RpcFuture.
+    """
+
+    def __init__(self, body, decode=None, content_type=None):
+        self.body = body
+        self.decode = decode
+        self.content_type = content_type
+
+    def done(self):
+        return True
+
+    def result(self, timeout=None):
+        if self.decode is None:
+            return self.body
+        return self.decode(self.body)
+
+
+def default_routes():
+    """
+    Maps each service queue name to the request handler of that service.
+    """
+    import DeletionServer
+    import EditServer
+    import QuitServer
+    import StringValidator
+    return {
+        'StringValidation': StringValidator.process_request,
+        'EditQueue': EditServer.process_request,
+        'DeletionQueue': DeletionServer.process_request,
+        'QuitQueue': QuitServer.process_request,
+    }
+
+
+class InProcessTransport:
+    """
+    Transport that calls the service handlers directly instead of going through RabbitMQ.
+
+    Request bodies are passed to the handler registered for the routing key
+    and the reply is returned as bytes, exactly as it would arrive from the
+    broker, so RpcClient subclasses work unchanged.
+
+    Attributes:
+        routes (dict): Queue name to handler taking a request body and content type
+            and returning a reply body.
+    """
+
+    def __init__(self, routes=None):
+        self.routes = routes if routes is not None else default_routes()
+
+    def send(self, routing_key, body, decode=None, content_type=None):
+        """
+        Runs the handler for routing_key on body and returns a CompletedFuture for its reply.
+        """
+        handler = self.routes.get(routing_key)
+        if handler is None:
+            raise KeyError(f"No in-process handler for queue '{routing_key}'")
+        response = handler(body, content_type)
+        if isinstance(response, str):
+            response = response.encode()
+        reply_type = None if content_type is None else codec.negotiate(content_type)
+        return CompletedFuture(response, decode, reply_type)
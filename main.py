@@ -1,6 +1,18 @@
-import pika, json, uuid
-import uuid
+import argparse
+import atexit
+import copy
+import logging
+import os
 import sys
+import time
+
+import metrics
+from codec import default_content_type
+from rpc import RpcClient, RpcTimeoutError, RpcUnavailableError, close_pool, gather
+from task import Task, WEEK_DAYS, task_to_dict, task_fields, apply_task_changes
+from task_index import DAY_ORDINALS, day_ordinal
+from task_store import TaskStore
+from validation import ValidationCache, validate_string
 
 FEATURE_NEW_EXTENSIONS_PAGE = "FeatureNewExtensions"
 ADVANCED_OPTIONS_PAGE = "AdvancedOptionsPage"
@@ -11,281 +23,298 @@ TUTORIAL_PAGE = "TutorialPage"
 EMAIL_SUPPORT_PAGE = "EmailSupportPage"
 ADD_TASK_PAGE = "AddTaskPage"
 MODIFY_TASK_PAGE = "ModifyTaskPage"
+CHANGE_PRIORITY_PAGE = "ChangePriorityPage"
 
+TASK_STORE_DIRECTORY = os.environ.get('SMS_DATA_DIR',
+                                      os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+# Selects the task storage engine: 'wal' (default) or 'sqlite'.
+TASK_STORE_BACKEND = os.environ.get('SMS_STORE', 'wal')
+# Selects how task contents are validated: 'remote' (default) asks the StringValidator service,
+# 'local' applies its length rule in-process.
+VALIDATION_MODE = os.environ.get('SMS_VALIDATION', 'remote')
+# Queues of the services that hold task state keyed by task id.
+TASK_SERVICE_QUEUES = ['EditQueue']
+# Replies of the StringValidator that are worth caching.
+VALIDATION_RESULTS = ["Too Small", "Too Big", "Just Right"]
 
-class Task:
-    """
-    Represents a task in the scheduling management system.
-
-    Attributes:
-        content (str): The description of the task.
-        index (int): The index position of the task within a day.
-        belong_week (str): The day of the week the task belongs to.
-        priority (str): The priority of the task, default is 'non-urgent'.
-    """
-
-    def __init__(self, content, index, belong_week, priority='non-urgent'):
-        """
-        Initializes the Task with content, index, belonging week, and priority.
-        """
-        self._content = content
-        self._index = index
-        self._belong_week = belong_week
-        self._priority = priority
-
-    def getContent(self):
-        """
-        Returns the content of the task.
-        """
-        return self._content
-
-    def getIndex(self):
-        """
-        Returns the index of the task.
-        """
-        return self._index
-
-    def getPriority(self):
-        """
-        Returns the priority of the task.
-        """
-        return self._priority
+logger = logging.getLogger('sms.main')
 
-    def getBelongWeek(self):
-        """
-        Returns the week day the task belongs to.
-        """
-        return self._belong_week
-
-    def setContent(self, content):
-        """
-        Sets the content of the task.
-        """
-        self._content = content
 
-    def setPriority(self, priority):
-        """
-        Sets the priority of the task.
-        """
-        self._priority = priority
-
-
-class StringValidatorClient(object):
+class StringValidatorClient(RpcClient):
     """Class used to send data to/receive data from the StringValidator microservice, via the .call()
-    function. As shown in the example iteration below, .call takes one parameter, a list containing: a user's string,
-    a lower bound of acceptability, and an upper bound of acceptability."""
+    function. .call takes one parameter, a list containing: a user's string, a lower bound of
+    acceptability, and an upper bound of acceptability, and returns the decoded result.
+
+    Results are memoized per (string, lower, upper) in a ValidationCache shared by every client in the
+    process. With local validation (SMS_VALIDATION=local) the length rule is applied in-process instead
+    of asking the service."""
+
+    cache = ValidationCache()
+
+    def __init__(self, local=None):
+        super().__init__('StringValidation', content_type=default_content_type())
+        self.local = VALIDATION_MODE == 'local' if local is None else local
+
+    def call(self, request):
+        key = tuple(request)
+        if self.local:
+            return validate_string(*key)
+        result = self.cache.get(key)
+        if result is None:
+            result = super().call(request)
+            if result in VALIDATION_RESULTS:
+                self.cache.put(key, result)
+        return result
+
+    def validate_many(self, strings, lower, upper):
+        """Validates several strings against the same bounds and returns the results in order. Strings
+        that are not cached are sent once each, in a single batch request."""
+        if self.local:
+            return [validate_string(string, lower, upper) for string in strings]
+        results = [self.cache.get((string, lower, upper)) for string in strings]
+        missing = list(dict.fromkeys(string for string, result in zip(strings, results) if result is None))
+        if missing:
+            answers = dict(zip(missing, super().call({'lower': lower, 'upper': upper, 'strings': missing})))
+            for string, result in answers.items():
+                if result in VALIDATION_RESULTS:
+                    self.cache.put((string, lower, upper), result)
+            results = [answers[string] if result is None else result for string, result in zip(strings, results)]
+        return results
+
+
+class TaskServiceClient(RpcClient):
+    """Base class for clients of services that own task state keyed by task id (see task_table).
+
+    A task is registered with its full record when the service has not seen it or it changed locally;
+    after that only patches go over the wire, and replies carry just the changed fields and a version."""
+
+    # Last (version, mutable fields, table epoch) synced per (queue, task id), shared by every client in the
+    # process. The epoch tells apart the tables of a remote service and of its local fallback.
+    versions = {}
+
+    def put_task(self, task):
+        self.put_tasks([task])
+
+    def put_tasks(self, tasks):
+        """Registers several tasks with pipelined requests."""
+        futures = [self.send({'task': 'put_task', 'task_id': task.getId(), 'task_data': task_to_dict(task)})
+                   for task in tasks]
+        for task, response in zip(tasks, gather(futures)):
+            self._synced((self.routing_key, task.getId()), task, response)
+
+    def update_task(self, task, request):
+        """Sends a patch request for task and applies the returned changes to task in place. The task is
+        registered first if the service has not seen it, or if it changed locally since the last sync."""
+        return self.update_tasks([(task, request)])[0]
+
+    def update_tasks(self, updates):
+        """Pipelined update_task for a list of (task, request) pairs naming distinct tasks. Registrations
+        go out together, then every patch, so a batch costs a few round trips instead of a few per task."""
+        keys = [(self.routing_key, task.getId()) for task, _ in updates]
+        self.put_tasks([task for (task, _), key in zip(updates, keys) if self._needs_put(key, task)])
+        responses = self._send_patches(updates, keys)
+        retry = [position for position, response in enumerate(responses) if self._unknown(response)]
+        if retry:
+            self.put_tasks([updates[position][0] for position in retry])
+            retried = self._send_patches([updates[position] for position in retry],
+                                         [keys[position] for position in retry])
+            for position, response in zip(retry, retried):
+                responses[position] = response
+        self._apply_responses([task for task, _ in updates], keys, responses)
+        return [task for task, _ in updates]
+
+    def _needs_put(self, key, task):
+        return self.versions.get(key) is None or self.versions[key][1] != task_fields(task)
+
+    def _synced(self, key, task, response):
+        # Put replies name the table's epoch; patch replies come from the table the task was registered with.
+        epoch = response.get('epoch', self.versions.get(key, (None, None, None))[2])
+        self.versions[key] = (response['version'], task_fields(task), epoch)
+
+    @staticmethod
+    def _unknown(response):
+        return isinstance(response, dict) and response.get('error') == 'unknown_task'
+
+    def _send_bulk(self, requests):
+        response = self.send({'task': 'bulk', 'requests': requests}).result()
+        if not isinstance(response, dict) or len(response.get('results', ())) != len(requests):
+            raise RuntimeError(f"{self.routing_key} could not handle a bulk request: {response}")
+        return response['results']
+
+    def _apply_responses(self, tasks, keys, responses):
+        for task, key, response in zip(tasks, keys, responses):
+            if not isinstance(response, dict) or 'changes' not in response:
+                raise RuntimeError(f"{self.routing_key} could not update task {task.getId()}: {response}")
+            apply_task_changes(task, response['changes'])
+            self._synced(key, task, response)
+
+    @classmethod
+    def forget_task(cls, task_id):
+        """Drops the synced versions of a deleted task for every task service."""
+        for queue in TASK_SERVICE_QUEUES:
+            cls.versions.pop((queue, task_id), None)
+
+    def _send_patches(self, updates, keys):
+        futures = []
+        for (task, request), key in zip(updates, keys):
+            request['task_id'] = task.getId()
+            request['version'], _, request['epoch'] = self.versions[key]
+            futures.append(self.send(request))
+        return gather(futures)
+
+
+class DeletionClient(TaskServiceClient):
+    """Class used to send deletion requests to the DeletionServer microservice."""
 
     def __init__(self):
-        self.connection = pika.BlockingConnection(
-            pika.ConnectionParameters(host='localhost'))
-
-        self.channel = self.connection.channel()
-
-        result = self.channel.queue_declare(queue='', exclusive=True)
-        self.callback_queue = result.method.queue
-
-        self.channel.basic_consume(
-            queue=self.callback_queue,
-            on_message_callback=self.on_response,
-            auto_ack=True)
-
-        self.response = None
-        self.corr_id = None
-
-    def on_response(self, ch, method, props, body):
-        if self.corr_id == props.correlation_id:
-            self.response = body
-
-    def call(self, string_list):
-        self.response = None
-        self.corr_id = str(uuid.uuid4())
-        self.channel.basic_publish(
-            exchange='',
-            routing_key='StringValidation',
-            properties=pika.BasicProperties(
-                reply_to=self.callback_queue,
-                correlation_id=self.corr_id,
-            ),
-            body=str(string_list))
-        while self.response is None:
-            self.connection.process_data_events(time_limit=None)
-        return self.response
-
-# class DeletionClient:
-#     def __init__(self):
-#         self.connection = pika.BlockingConnection(pika.ConnectionParameters(host='localhost'))
-#         self.channel = self.connection.channel()
-#
-#         result = self.channel.queue_declare(queue='', exclusive=True)
-#         self.callback_queue = result.method.queue
-#
-#         self.channel.basic_consume(queue=self.callback_queue,
-#                                    on_message_callback=self.on_response,
-#                                    auto_ack=True)
-#
-#         self.response = None
-#         self.corr_id = None
-#
-#     def on_response(self, ch, method, props, body):
-#         if self.corr_id == props.correlation_id:
-#             self.response = body
-#
-#     def call(self, task, userInput=None):
-#         self.response = None
-#         self.corr_id = str(uuid.uuid4())
-#         request = {'task': task, 'userInput': userInput}
-#
-#         self.channel.basic_publish(exchange='',
-#                                    routing_key='DeletionQueue',
-#                                    properties=pika.BasicProperties(
-#                                        reply_to=self.callback_queue,
-#                                        correlation_id=self.corr_id,
-#                                    ),
-#                                    body=json.dumps(request))
-#         while self.response is None:
-#             self.connection.process_data_events(time_limit=None)
-#         return json.loads(self.response)
-#
-#     def close(self):
-#         self.connection.close()
-
-
-class DeletionClient:
-    def __init__(self):
-        self.connection = pika.BlockingConnection(pika.ConnectionParameters(host='localhost'))
-        self.channel = self.connection.channel()
-        result = self.channel.queue_declare(queue='', exclusive=True)
-        self.callback_queue = result.method.queue
-        self.channel.basic_consume(queue=self.callback_queue,
-                                   on_message_callback=self.on_response,
-                                   auto_ack=True)
-        self.response = None
-        self.corr_id = None
-
-    def on_response(self, ch, method, props, body):
-        if self.corr_id == props.correlation_id:
-            self.response = body
-
-    def call(self, task, task_data=None, userInput=None):
-        self.response = None
-        self.corr_id = str(uuid.uuid4())
+        super().__init__('DeletionQueue', content_type=default_content_type())
+
+    def build_request(self, task, task_data=None, userInput=None):
         request = {'task': task}
         if task_data:
             request['task_data'] = task_data
         if userInput:
             request['userInput'] = userInput
-
-        self.channel.basic_publish(exchange='',
-                                   routing_key='DeletionQueue',
-                                   properties=pika.BasicProperties(
-                                       reply_to=self.callback_queue,
-                                       correlation_id=self.corr_id,
-                                   ),
-                                   body=json.dumps(request))
-        while self.response is None:
-            self.connection.process_data_events(time_limit=None)
-        return json.loads(self.response)
-
-    def close(self):
-        self.connection.close()
-
-
-
-
-class QuitServerClient:
+        return request
+
+    def delete_task(self, currentTask):
+        return self.delete_tasks([currentTask])[0]
+
+    def delete_tasks(self, tasks):
+        """Deletes several tasks on the service with pipelined requests and forgets their sync state.
+        Tasks are registered with the EditServer (see TaskServiceClient), so it is sent the deletes too,
+        pipelined with the others."""
+        clients = (self, EditClient())
+        futures = [[client.send({'task': 'delete_task', 'task_id': task.getId()}) for client in clients]
+                   for task in tasks]
+        for task, replies in zip(tasks, futures):
+            for client, response in zip(clients, gather(replies)):
+                if not isinstance(response, dict) or not response.get('deleted'):
+                    raise RuntimeError(f"{client.routing_key} could not delete task {task.getId()}: {response}")
+            self.forget_task(task.getId())
+        return tasks
+
+
+class QuitServerClient(RpcClient):
     """Class used to send messages to the QuitServer microservice and listen for quit signals."""
 
     def __init__(self):
-        self.connection = pika.BlockingConnection(
-            pika.ConnectionParameters(host='localhost'))
-
-        self.channel = self.connection.channel()
-
-        result = self.channel.queue_declare(queue='', exclusive=True)
-        self.callback_queue = result.method.queue
-
-        self.channel.basic_consume(
-            queue=self.callback_queue,
-            on_message_callback=self.on_response,
-            auto_ack=True)
-
-        self.response = None
-        self.corr_id = None
-
-    def on_response(self, ch, method, props, body):
-        if self.corr_id == props.correlation_id:
-            self.response = body
-            message = body.decode()
-            print(f"Server response: {message}")
-            if "shutting down" in message:
-                print("Client is exiting as per server's request.")
-                self.connection.close()
-                sys.exit()
+        super().__init__('QuitQueue')
 
     def call(self, message):
-        self.response = None
-        self.corr_id = str(uuid.uuid4())
-        self.channel.basic_publish(
-            exchange='',
-            routing_key='QuitQueue',
-            properties=pika.BasicProperties(
-                reply_to=self.callback_queue,
-                correlation_id=self.corr_id,
-            ),
-            body=message)
-        while self.response is None:
-            self.connection.process_data_events(time_limit=None)
-        return self.response
-
-class EditClient:
-    def __init__(self):
-        self.connection = pika.BlockingConnection(pika.ConnectionParameters(host='localhost'))
-        self.channel = self.connection.channel()
-
-        result = self.channel.queue_declare(queue='', exclusive=True)
-        self.callback_queue = result.method.queue
+        response = super().call(message)
+        message = response.decode()
+        metrics.log_event(logger, logging.DEBUG, 'quit_response', message=message)
+        return response
 
-        self.channel.basic_consume(queue=self.callback_queue,
-                                   on_message_callback=self.on_response,
-                                   auto_ack=True)
 
-        self.response = None
-        self.corr_id = None
+class EditClient(TaskServiceClient):
+    """Class used to send edit requests to the EditServer microservice."""
 
-    def on_response(self, ch, method, props, body):
-        if self.corr_id == props.correlation_id:
-            self.response = body
+    def __init__(self):
+        super().__init__('EditQueue', content_type=default_content_type())
 
-    def call(self, task, currentTask, new_content=None, new_priority=None):
-        self.response = None
-        self.corr_id = str(uuid.uuid4())
+    def build_request(self, task, currentTask, new_content=None, new_priority=None):
         request = {
             'task': task,
-            'task_data': {
-                'content': currentTask.getContent(),
-                'index': currentTask.getIndex(),
-                'belong_week': currentTask.getBelongWeek(),
-                'priority': currentTask.getPriority()
-            }
+            'task_data': task_to_dict(currentTask)
         }
         if new_content:
             request['new_content'] = new_content
         if new_priority:
             request['new_priority'] = new_priority
+        return request
+
+    def edit_content(self, currentTask, new_content):
+        return self.update_task(currentTask, {'task': 'patch_task', 'changes': {'content': new_content}})
+
+    def edit_priority(self, currentTask, new_priority):
+        return self.update_task(currentTask, {'task': 'patch_task', 'changes': {'priority': new_priority}})
+
+    def bulk_update(self, updates):
+        """update_tasks in a single 'bulk' message: registrations and patches travel together and come back
+        as one list of results, so any number of tasks costs one round trip. Tasks last synced with another
+        instance of the service, such as the local fallback, are registered again and patched afterwards."""
+        keys = [(self.routing_key, task.getId()) for task, _ in updates]
+        registrations = [task for (task, _), key in zip(updates, keys) if self._needs_put(key, task)]
+        registered = {task.getId() for task in registrations}
+        requests = [{'task': 'put_task', 'task_id': task.getId(), 'task_data': task_to_dict(task)}
+                    for task in registrations]
+        for (task, request), key in zip(updates, keys):
+            request['task_id'] = task.getId()
+            # A task registered in this message has no known version yet; the reply then carries every field.
+            if task.getId() in registered:
+                request['version'] = request['epoch'] = None
+            else:
+                request['version'], _, request['epoch'] = self.versions[key]
+            requests.append(request)
+        results = self._send_bulk(requests)
+        for task, response in zip(registrations, results):
+            self._synced((self.routing_key, task.getId()), task, response)
+        responses = results[len(registrations):]
+        retry = [position for position, response in enumerate(responses) if self._unknown(response)]
+        done = [position for position, response in enumerate(responses) if not self._unknown(response)]
+        self._apply_responses([updates[position][0] for position in done], [keys[position] for position in done],
+                              [responses[position] for position in done])
+        if retry:
+            for position in retry:
+                self.versions.pop(keys[position], None)
+            self.update_tasks([updates[position] for position in retry])
+        return [task for task, _ in updates]
+
+    def update_where(self, tasks, where, changes):
+        """Applies changes to those of tasks whose fields equal every value in where, in one message.
+        The service evaluates where, for example {'belong_week': 'Monday', 'priority': 'non-urgent'},
+        and the matching tasks are updated in place and returned. Tasks last synced with another
+        instance of the service are registered again and matched in a second message."""
+        byId = {task.getId(): task for task in tasks}
+        registrations = [task for task in tasks if self._needs_put((self.routing_key, task.getId()), task)]
+        requests = [{'task': 'put_task', 'task_id': task.getId(), 'task_data': task_to_dict(task)}
+                    for task in registrations]
+        requests.append(self._patch_where(tasks, {task.getId() for task in registrations}, where, changes))
+        results = self._send_bulk(requests)
+        for task, response in zip(registrations, results):
+            self._synced((self.routing_key, task.getId()), task, response)
+        matched = self._matched(results[-1], where)
+        stale = [byId[response['task_id']] for response in matched if self._unknown(response)]
+        if stale:
+            self.put_tasks(stale)
+            matched = [response for response in matched if not self._unknown(response)]
+            matched += self._matched(self._send_bulk([self._patch_where(stale, set(), where, changes)])[0], where)
+        updated = [byId[response['task_id']] for response in matched]
+        self._apply_responses(updated, [(self.routing_key, task.getId()) for task in updated], matched)
+        return updated
+
+    def _patch_where(self, tasks, registered, where, changes):
+        # Tasks registered in the same message are sure to be on the table that evaluates the request.
+        epochs = [None if task.getId() in registered else self.versions[(self.routing_key, task.getId())][2]
+                  for task in tasks]
+        return {'task': 'patch_where', 'where': where, 'changes': changes,
+                'task_ids': [task.getId() for task in tasks], 'epochs': epochs}
+
+    def _matched(self, response, where):
+        if not isinstance(response, dict) or 'results' not in response:
+            raise RuntimeError(f"{self.routing_key} could not update tasks matching {where}: {response}")
+        return response['results']
+
+
+class Session:
+    """
+    State carried between pages of the user interface.
+
+    Attributes:
+        customFeatureChoice (str): 'A' for typical or 'B' for custom features, None until chosen.
+        currentDate (str): The day whose schedule is being viewed.
+        currentTask (Task): The task being added or modified.
+        urgentFirst (bool): Whether daily schedules list urgent tasks first.
+    """
 
-        self.channel.basic_publish(exchange='',
-                                   routing_key='EditQueue',
-                                   properties=pika.BasicProperties(
-                                       reply_to=self.callback_queue,
-                                       correlation_id=self.corr_id,
-                                   ),
-                                   body=json.dumps(request))
-        while self.response is None:
-            self.connection.process_data_events(time_limit=None)
-        return json.loads(self.response)
+    def __init__(self):
+        self.customFeatureChoice = None
+        self.currentDate = None
+        self.currentTask = None
+        self.urgentFirst = False
 
-    def close(self):
-        self.connection.close()
 
 def DisplayFeatureNewExtensions():
     """
@@ -379,28 +408,91 @@ def DisplayTutorial():
     print("\n")
 
 
-def DisplayDailySchedule(date, customFeatureChoice):
+# Rendered daily schedules by (day index, feature choice, urgent first), each stored with the store's day version it
+# was rendered at, so unchanged days are redrawn without formatting their tasks again.
+renderedSchedules = {}
+
+
+def RenderDailySchedule(weekIndex, customFeatureChoice, urgentFirst=False):
+    """
+    Returns the text DisplayDailySchedule writes for a day.
+
+    With urgentFirst, urgent tasks are listed before the others, still numbered by their position.
+    Completed tasks are marked as done.
+    """
+    taskStore = get_task_store()
+    if urgentFirst:
+        positions, tasks = taskStore.tasks_urgent_first(weekIndex)
+        numbered = zip((position + 1 for position in positions), tasks)
+    else:
+        numbered = enumerate(taskStore.tasks_for_day(weekIndex), 1)
+    lines = [WEEK_DAYS[weekIndex] + ': ']
+    if customFeatureChoice == 'A':
+        lines.extend(f"{taskIndex}. {task.getContent()} Priority: {task.getPriority()}"
+                     f"{' (done)' if task.isCompleted() else ''}"
+                     for taskIndex, task in numbered)
+    elif customFeatureChoice == 'B':
+        lines.extend(f"{taskIndex}. {task.getContent()}{' (done)' if task.isCompleted() else ''}"
+                     for taskIndex, task in numbered)
+    lines.append('\n\n')
+    return '\n'.join(lines)
+
+
+def DisplayDailySchedule(date, customFeatureChoice, urgentFirst=False):
     """
     Displays the tasks scheduled for a specific day.
 
+    The day is rendered once per change of its tasks and written with a single write.
+
     Args:
         date (str): The day of the week to display tasks for.
+        urgentFirst (bool): List urgent tasks before the others.
     """
-    weekList = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    for weekIndex in range(0, 7):
-        if date == weekList[weekIndex]:
-            print(weekList[weekIndex] + ': ')
-            taskAmount = len(weekTaskList[weekIndex])
-            for taskIndex in range(0, taskAmount):
-                if customFeatureChoice == 'A':
-                    print(str(taskIndex + 1) + ". " + weekTaskList[weekIndex][taskIndex].getContent()
-                          + " Priority: " + weekTaskList[weekIndex][taskIndex].getPriority())
-                elif customFeatureChoice == 'B':
-                    print(str(taskIndex + 1) + ". " + weekTaskList[weekIndex][taskIndex].getContent())
-    print("\n")
+    taskStore = get_task_store()
+    weekIndex = DAY_ORDINALS.get(date)
+    if weekIndex is None:
+        sys.stdout.write("\n\n")
+        return date
+    version = taskStore.day_version(weekIndex)
+    key = (weekIndex, customFeatureChoice, urgentFirst)
+    rendered = renderedSchedules.get(key)
+    if rendered is None or rendered[0] != version:
+        rendered = (version, RenderDailySchedule(weekIndex, customFeatureChoice, urgentFirst))
+        renderedSchedules[key] = rendered
+    sys.stdout.write(rendered[1])
     return date
 
 
+def DisplayUrgentTasks():
+    """
+    Displays the urgent tasks of the whole week, Monday first.
+    """
+    lines = ["Urgent tasks this week: "]
+    lines.extend(f"{WEEK_DAYS[weekIndex]} {position + 1}. {task.getContent()}"
+                 for weekIndex, position, task in get_task_store().urgent_tasks())
+    lines.append('\n\n')
+    sys.stdout.write('\n'.join(lines))
+
+
+def FormatCompletion(counts):
+    """
+    Formats a completed count, total and rate as 'completed/total (rate%)'.
+    """
+    return f"{counts['completed']}/{counts['total']} ({counts['rate']:.0%})"
+
+
+def DisplayCompletionStats():
+    """
+    Displays the completion rate of the week, of every day and of every priority.
+    """
+    summary = get_task_store().stats.summary()
+    lines = ["Completed this week: " + FormatCompletion(summary['week'])]
+    lines.extend(f"{day}: {FormatCompletion(counts)}" for day, counts in zip(WEEK_DAYS, summary['days']))
+    lines.extend(f"{priority}: {FormatCompletion(counts)}" for priority, counts in summary['priorities'].items())
+    lines.append('\n\n')
+    sys.stdout.write('\n'.join(lines))
+
+
 def DisplayAddTask(currentDate):
     """
     Prompts user to add a task for a specific date.
@@ -414,13 +506,11 @@ def DisplayTaskModify(date, index):
     """
     Display task modify page.
     """
-    weekList = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    for weekIndex in range(0, 7):
-        if date == weekList[weekIndex]:
-            currentTask = weekTaskList[weekIndex][index - 1]
-            print('Current task: ' + str(index) + '. ' + currentTask.getContent())
-            print("\n")
-            return currentTask
+    taskStore = get_task_store()
+    currentTask = taskStore.task_at(day_ordinal(date), index - 1)
+    print('Current task: ' + str(index) + '. ' + currentTask.getContent())
+    print("\n")
+    return currentTask
 
 
 def DisplayCommands(status):
@@ -454,6 +544,9 @@ def DisplayCommands(status):
               "daily tasks from Monday to Sunday.")
         print("- Type integer like 1/2/7/etc to modify certain tasks.")
         print("- Type 'add', 'Add' or 'A' to add tasks.")
+        print("- Type 'sort' to switch between listing urgent tasks first and listing tasks in order.")
+        print("- Type 'urgent' to list the urgent tasks of the whole week.")
+        print("- Type 'stats' to see how many tasks are completed per day, per priority and this week.")
         print("- Type 'mail', 'Mail' or 'M' to access email support for any inquiries or issues.")
         print("- Type 'tutorial', 'Tutorial' or 'T' to access help tutorials and guides.")
         print("- Type 'Q' or 'quit' to leave.")
@@ -465,6 +558,7 @@ def DisplayCommands(status):
     elif status == MODIFY_TASK_PAGE:
         print("COMMANDS:")
         print("- Type 'edit', 'Edit' or 'E' to edit tasks.")
+        print("- Type 'done' to mark the task as completed, or as not completed if it already is.")
         print("- Type 'back', 'Back' or 'B' to return to the previous page.")
         print("- Type 'delete', 'Delete' or 'D' to delete task.")
         print("- Type 'Q' or 'quit' to leave.")
@@ -481,12 +575,10 @@ def DisplayCommands(status):
         print("\n")
 
 
-def FeatureNewExtensionsInputEvent():
+def FeatureNewExtensionsInputEvent(session):
     """
     Handles user input for the Feature New Extensions page.
     """
-    userInput = None
-
     while True:
         userInput = input("[Enter/Q]: ")
         print("\n")
@@ -494,22 +586,17 @@ def FeatureNewExtensionsInputEvent():
             # page 2
             DisplayAdvancedOptions()
             DisplayCommands(ADVANCED_OPTIONS_PAGE)
-            AdvancedOptionsInputEvent()
-            break
+            return ADVANCED_OPTIONS_PAGE
         elif userInput == 'Q' or userInput == 'quit':
             QuitProgram()
         else:
             print("Invalid input, try again.")
 
-    return userInput
-
 
-def AdvancedOptionsInputEvent():
+def AdvancedOptionsInputEvent(session):
     """
     Handles user input for the Advanced Options page.
     """
-    userInput = None
-
     while True:
         userInput = input("[Enter/Q]: ")
         print("\n")
@@ -517,118 +604,108 @@ def AdvancedOptionsInputEvent():
             # page 2
             DisplayFeaturesInstallation()
             DisplayCommands(FEATURES_INSTALLATION_PAGE)
-            FeaturesInstallationInputEvent()
-            break
+            return FEATURES_INSTALLATION_PAGE
         elif userInput == 'Q' or userInput == 'quit':
             QuitProgram()
         else:
             print("Invalid input, try again.")
 
-    return userInput
 
-
-def FeaturesInstallationInputEvent():
+def FeaturesInstallationInputEvent(session):
     """
     Handles user input for the Features Installation page.
     """
-    userInput = None
-
     while True:
         userInput = input("[A/B/Q]: ")
         print("\n")
         if userInput == 'A' or userInput == 'B':
-            customFeatureChoice = userInput
+            session.customFeatureChoice = userInput
             DisplaySchedulingManagementSystemMain()
             DisplayCommands(SCHEDULING_MANAGEMENT_SYSTEM_MAIN_PAGE)
-            currentDate = SchedulingManagementSystemMainInputEvent(customFeatureChoice)
-            break
+            return SCHEDULING_MANAGEMENT_SYSTEM_MAIN_PAGE
         elif userInput == 'Q' or userInput == 'quit':
             QuitProgram()
         else:
             print("Invalid input, try again.")
 
-    return userInput
 
-
-def MailAndTutorialInputEvent(customFeatureChoice):
+def MailAndTutorialInputEvent(session):
     """
     Handles user input for the Mail and Tutorial pages.
     """
-
     while True:
         userInput = input("[back/quit]: ")
         print("\n")
         if userInput in ['back', 'Back', 'B']:
             DisplaySchedulingManagementSystemMain()
             DisplayCommands(SCHEDULING_MANAGEMENT_SYSTEM_MAIN_PAGE)
-            currentDate = SchedulingManagementSystemMainInputEvent(customFeatureChoice)
-            break
+            return SCHEDULING_MANAGEMENT_SYSTEM_MAIN_PAGE
         elif userInput == 'Q' or userInput == 'quit':
             QuitProgram()
         else:
             print("Invalid input, try again.")
 
-    return userInput
-
 
-def DailyAddTaskInputEvent(currentDate, customFeatureChoice):
+def DailyAddTaskInputEvent(session):
     """
-    Handles adding a new task for a specified date.
+    Handles adding a new task for the current date.
     """
+    taskStore = get_task_store()
+    currentDate = session.currentDate
+    weekIndex = day_ordinal(currentDate)
+    stringValidator = StringValidatorClient()
+    # check string validation
+    while True:
+        userInput = input("Type your task: ")
+        test_string = userInput
+        test_lower = 0
+        test_upper = 40
+        test_body = [test_string, test_lower, test_upper]
+        jresp = stringValidator.call(test_body)
 
-    weekList = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    for weekIndex in range(0, 7):
-        if currentDate == weekList[weekIndex]:
-            stringValidator = StringValidatorClient()
-            # check string validation
-            while True:
-                userInput = input("Type your task: ")
-                test_string = userInput
-                test_lower = 0
-                test_upper = 40
-                test_body = [test_string, test_lower, test_upper]
-                send_body = json.dumps(test_body)
-                response = stringValidator.call(send_body)
-
-                jresp = json.loads(response)
-
-                if jresp == "Just Right":
-                    newTask = Task(userInput, weekIndex + 1, currentDate)
-                    break
-                else:
-                    print("Invalid input, try again.")
+        if jresp == "Just Right":
+            newTask = Task(userInput, taskStore.count_for_day(weekIndex) + 1, currentDate)
+            break
+        else:
+            print("Invalid input, try again.")
 
-            weekTaskList[weekIndex].append(newTask)
-            if customFeatureChoice == 'A':
-                DailyChangePriorityInputEvent(newTask, customFeatureChoice)
-                break
-            elif customFeatureChoice == 'B':
-                DisplayDailySchedule(currentDate, customFeatureChoice)
-                DisplayCommands(DAILY_SCHEDULE_PAGE)
-                DailyScheduleInputEvent(currentDate, customFeatureChoice)
+    taskStore.append(weekIndex, newTask)
+    if session.customFeatureChoice == 'A':
+        session.currentTask = newTask
+        return CHANGE_PRIORITY_PAGE
+    elif session.customFeatureChoice == 'B':
+        DisplayDailySchedule(currentDate, session.customFeatureChoice, session.urgentFirst)
+        DisplayCommands(DAILY_SCHEDULE_PAGE)
+        return DAILY_SCHEDULE_PAGE
 
 
-def DailyChangePriorityInputEvent(currentTask, customFeatureChoice):
+def DailyChangePriorityInputEvent(session):
     """
-    Handles changing the priority of a specific task.
+    Handles changing the priority of the task just added.
     """
+    taskStore = get_task_store()
+    currentTask = session.currentTask
     while True:
         userInput = input("Type the Priority for this task [urgent/non-urgent]: ")
         print("\n")
         if userInput in ['urgent', 'non-urgent']:
-            currentTask.setPriority(userInput)
-            DisplayDailySchedule(currentTask.getBelongWeek(), customFeatureChoice)
+            taskStore.set_priority(*taskStore.locate(currentTask.getId()), userInput)
+            session.currentDate = currentTask.getBelongWeek()
+            DisplayDailySchedule(session.currentDate, session.customFeatureChoice, session.urgentFirst)
             DisplayCommands(DAILY_SCHEDULE_PAGE)
-            DailyScheduleInputEvent(currentTask.getBelongWeek(), customFeatureChoice)
+            return DAILY_SCHEDULE_PAGE
         else:
             print("Invalid input, try again.")
 
-def TaskModifyInputEvent(currentTask, customFeatureChoice):
+
+def TaskModifyInputEvent(session):
     """
-    Handles modifying a specific task.
+    Handles modifying the current task.
     """
+    currentTask = session.currentTask
+    customFeatureChoice = session.customFeatureChoice
     while True:
-        userInput = input("[edit/back/delete/Q]: ")
+        userInput = input("[edit/done/back/delete/Q]: ")
 
         print("\n")
         if userInput in ['edit', 'Edit', 'E']:
@@ -638,27 +715,33 @@ def TaskModifyInputEvent(currentTask, customFeatureChoice):
             elif customFeatureChoice == 'B':
                 ChangeTaskObjectInWeekList(currentTask, EditTask(currentTask))
             print("\n")
-            DisplayDailySchedule(currentTask.getBelongWeek(), customFeatureChoice)
-            DisplayCommands(DAILY_SCHEDULE_PAGE)
-            DailyScheduleInputEvent(currentTask.getBelongWeek(), customFeatureChoice)
+            break
+        elif userInput == 'done':
+            CompleteTask(currentTask, not currentTask.isCompleted())
+            break
         elif userInput in ['delete', 'Delete', 'D']:
             userChoice = DoubleCheckDeletion()
             if userChoice:
-                ChangeTaskObjectInWeekList(currentTask, DeleteTask(currentTask))
+                DeleteTask(currentTask)
             else:
                 print("Deletion canceled.")
             print("\n")
-            DisplayDailySchedule(currentTask.getBelongWeek(), customFeatureChoice)
-            DisplayCommands(DAILY_SCHEDULE_PAGE)
-            DailyScheduleInputEvent(currentTask.getBelongWeek(), customFeatureChoice)
+            break
+        elif userInput in ['back', 'Back', 'B']:
+            break
         elif userInput == 'Q' or userInput == 'quit':
             QuitProgram()
         else:
             print("Invalid input, try again.")
 
+    session.currentDate = currentTask.getBelongWeek()
+    DisplayDailySchedule(session.currentDate, customFeatureChoice, session.urgentFirst)
+    DisplayCommands(DAILY_SCHEDULE_PAGE)
+    return DAILY_SCHEDULE_PAGE
+
 def DoubleCheckDeletion():
+    deletion_client = DeletionClient()
     while True:
-        deletion_client = DeletionClient()
         userInput = input('Do you want to delete this task? [Y/N]: ')
 
         response = deletion_client.call(task='DoubleCheckDeletion', userInput=userInput)
@@ -668,29 +751,44 @@ def DoubleCheckDeletion():
         else:
             print(response)
 
+def SetDayPriority(weekIndex, priority, newPriority):
+    """
+    Changes every task of a day that has priority to newPriority with one EditServer request.
+
+    Returns:
+        list: The tasks that were changed.
+    """
+    taskStore = get_task_store()
+    changed = EditClient().update_where(taskStore.tasks_for_day(weekIndex),
+                                        {'belong_week': WEEK_DAYS[weekIndex], 'priority': priority},
+                                        {'priority': newPriority})
+    for task in changed:
+        taskStore.put(*taskStore.locate(task.getId()), task)
+    return changed
+
+def CompleteTask(currentTask, completed=True):
+    """
+    Marks a task as completed, or as not completed, in the task store and returns it.
+    """
+    taskStore = get_task_store()
+    return taskStore.complete(*taskStore.locate(currentTask.getId()), completed)
+
 def DeleteTask(currentTask):
+    taskStore = get_task_store()
     delete_client = DeletionClient()
-    response = delete_client.call(task = 'edit_task', task_data = task_to_dict(currentTask))
-    return_task_obj = dict_to_task(response)
-    return return_task_obj
+    delete_client.delete_task(currentTask)
+    weekIndex, position = taskStore.locate(currentTask.getId())
+    return taskStore.delete(weekIndex, position)
 
-def task_to_dict(task):
-    return {
-        'content': task.getContent(),
-        'index': task.getIndex(),
-        'belong_week': task.getBelongWeek(),
-        'priority': task.getPriority()
-    }
-def dict_to_task(task_dict):
+def open_task_store():
     """
-    Converts a dictionary to a Task object.
+    Opens the task storage engine selected by TASK_STORE_BACKEND.
     """
-    content = task_dict.get('_content')
-    index = task_dict.get('_index')
-    belong_week = task_dict.get('_belong_week')
-    priority = task_dict.get('_priority', 'non-urgent')  # Default to 'non-urgent' if not provided
-
-    return Task(content, index, belong_week, priority)
+    if TASK_STORE_BACKEND == 'sqlite':
+        from task_repository import SqliteTaskRepository
+        os.makedirs(TASK_STORE_DIRECTORY, exist_ok=True)
+        return SqliteTaskRepository(os.path.join(TASK_STORE_DIRECTORY, 'tasks.db'), Task).open()
+    return TaskStore(TASK_STORE_DIRECTORY, Task).open()
 
 def EditTask(currentTask):
     stringValidator = StringValidatorClient()
@@ -701,16 +799,11 @@ def EditTask(currentTask):
         test_lower = 0
         test_upper = 40
         test_body = [test_string, test_lower, test_upper]
-        send_body = json.dumps(test_body)
-        response = stringValidator.call(send_body)
-
-        jresp = json.loads(response)
+        jresp = stringValidator.call(test_body)
 
         if jresp == "Just Right":
             edit_client = EditClient()
-            response = edit_client.call('edit_task', currentTask, new_content=userInput)
-            return_task_obj = dict_to_task(response)
-            return return_task_obj
+            return edit_client.edit_content(currentTask, userInput)
         else:
             print("Invalid input, try again.")
 
@@ -719,28 +812,39 @@ def EditTaskPriority(currentTask):
         userInput = input("Type the modified priority [urgent/non-urgent]: ")
         if userInput in ['urgent', 'non-urgent']:
             edit_client = EditClient()
-            response = edit_client.call('edit_task_priority', currentTask, new_priority=userInput)
-            return_task_obj = dict_to_task(response)
-            return return_task_obj
+            return edit_client.edit_priority(currentTask, userInput)
         else:
             print("Invalid input, try again.")
 
 def ChangeTaskObjectInWeekList(OriginalTaskObject, TaskObject):
-    taskIndex = OriginalTaskObject.getIndex()
-    date = OriginalTaskObject.getBelongWeek()
-
-    weekList = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    for weekIndex in range(0, 7):
-        if date == weekList[weekIndex]:
-            weekTaskList[weekIndex][taskIndex - 1] = TaskObject
-            return weekTaskList[weekIndex][taskIndex - 1]
+    taskStore = get_task_store()
+    weekIndex, position = taskStore.locate(OriginalTaskObject.getId())
+    return taskStore.put(weekIndex, position, TaskObject)
 
 def QuitProgram():
+    taskStore = get_task_store()
     quit_server_client = QuitServerClient()
     userInput = input("Exit program? [Y/N]: ")
     if userInput in ['Y', 'N']:
-        response = quit_server_client.call(userInput)
-        print(response.decode())
+        try:
+            response = quit_server_client.call(userInput).decode()
+        except (RpcUnavailableError, RpcTimeoutError) as e:
+            if userInput == 'N':
+                raise
+            # Nobody can tell the services to stop; leave without claiming they drained.
+            metrics.log_event(logger, logging.WARNING, 'quit_unavailable', error=str(e))
+            print("QuitServer unavailable: no shutdown was broadcast, the services are still running.")
+            print("Client is exiting.")
+            taskStore.close()
+            close_pool()
+            sys.exit()
+        print(response)
+        if "shutting down" in response:
+            # The services have drained; flush the local store before leaving.
+            print("Client is exiting as per server's request.")
+            taskStore.close()
+            close_pool()
+            sys.exit()
     else:
         print("Invalid input, try again.")
 
@@ -748,36 +852,55 @@ def ExceedTaskMaximun(currentDate):
     """
     Handles user input for daily task management and navigation.
     """
-    weekList = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    for weekIndex in range(0, 7):
-        if currentDate == weekList[weekIndex]:
-            totalTaskAmount = len(weekTaskList[weekIndex])
-            if totalTaskAmount < 10:
-                return False
-            else:
-                return True
+    taskStore = get_task_store()
+    totalTaskAmount = taskStore.count_for_day(day_ordinal(currentDate))
+    if totalTaskAmount < 10:
+        return False
+    else:
+        return True
 
 
-def DailyScheduleInputEvent(currentDate, customFeatureChoice):
+def DailyScheduleInputEvent(session):
     """
-    Handles main input events for the scheduling management system.
+    Handles input events for the daily schedule of the current date.
     """
+    taskStore = get_task_store()
+    currentDate = session.currentDate
     while True:
-        userInput = input("[Monday/Tuesday/Wednesday/Thursday/Friday/Saturday/1/2/.../add/Sunday/mail/tutorial/Q]: ")
+        userInput = input("[Monday/Tuesday/Wednesday/Thursday/Friday/Saturday/1/2/.../add/Sunday/sort/urgent/"
+                          "stats/mail/tutorial/Q]: ")
 
         print("\n")
         if userInput in ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',
                          'Saturday', 'Sunday']:
-            DisplayDailySchedule(userInput, customFeatureChoice)
+            session.currentDate = userInput
+            DisplayDailySchedule(userInput, session.customFeatureChoice, session.urgentFirst)
             DisplayCommands(DAILY_SCHEDULE_PAGE)
-            DailyScheduleInputEvent(userInput, customFeatureChoice)
-            break
+            return DAILY_SCHEDULE_PAGE
+
+        elif userInput == 'sort':
+            session.urgentFirst = not session.urgentFirst
+            DisplayDailySchedule(currentDate, session.customFeatureChoice, session.urgentFirst)
+            DisplayCommands(DAILY_SCHEDULE_PAGE)
+            return DAILY_SCHEDULE_PAGE
+
+        elif userInput == 'urgent':
+            DisplayUrgentTasks()
+            DisplayCommands(DAILY_SCHEDULE_PAGE)
+            return DAILY_SCHEDULE_PAGE
+
+        elif userInput == 'stats':
+            DisplayCompletionStats()
+            DisplayCommands(DAILY_SCHEDULE_PAGE)
+            return DAILY_SCHEDULE_PAGE
 
         elif userInput.isnumeric():
-            currentTask = DisplayTaskModify(currentDate, int(userInput))
+            if not 1 <= int(userInput) <= taskStore.count_for_day(day_ordinal(currentDate)):
+                print("Invalid input, try again.")
+                continue
+            session.currentTask = DisplayTaskModify(currentDate, int(userInput))
             DisplayCommands(MODIFY_TASK_PAGE)
-            TaskModifyInputEvent(currentTask, customFeatureChoice)
-            break
+            return MODIFY_TASK_PAGE
 
         elif userInput in ['add', 'Add', 'A']:
             if ExceedTaskMaximun(currentDate):
@@ -787,38 +910,33 @@ def DailyScheduleInputEvent(currentDate, customFeatureChoice):
                     if userInput == 'Y':
                         DisplayAddTask(currentDate)
                         DisplayCommands(ADD_TASK_PAGE)
-                        DailyAddTaskInputEvent(currentDate, customFeatureChoice)
-                        break
+                        return ADD_TASK_PAGE
                     elif userInput == 'N':
                         print("\n")
                         DisplayCommands(DAILY_SCHEDULE_PAGE)
-                        DailyScheduleInputEvent(currentDate, customFeatureChoice)
-                        break
+                        return DAILY_SCHEDULE_PAGE
                     else:
                         print("Invalid input, try again.")
             else:
                 DisplayAddTask(currentDate)
                 DisplayCommands(ADD_TASK_PAGE)
-                DailyAddTaskInputEvent(currentDate, customFeatureChoice)
-                break
+                return ADD_TASK_PAGE
 
         elif userInput in ['mail', 'Mail', 'M']:
             DisplayEmailSupport()
             DisplayCommands(EMAIL_SUPPORT_PAGE)
-            MailAndTutorialInputEvent(customFeatureChoice)
-            break
+            return EMAIL_SUPPORT_PAGE
         elif userInput in ['tutorial', 'Tutorial', 'T']:
             DisplayTutorial()
             DisplayCommands(TUTORIAL_PAGE)
-            MailAndTutorialInputEvent(customFeatureChoice)
-            break
+            return TUTORIAL_PAGE
         elif userInput == 'Q' or userInput == 'quit':
             QuitProgram()
         else:
             print("Invalid input, try again.")
 
 
-def SchedulingManagementSystemMainInputEvent(customFeatureChoice):
+def SchedulingManagementSystemMainInputEvent(session):
     """
     Handles main input events for the scheduling management system.
     """
@@ -827,30 +945,56 @@ def SchedulingManagementSystemMainInputEvent(customFeatureChoice):
         print("\n")
         if userInput in ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',
                          'Saturday', 'Sunday']:
-            if customFeatureChoice == 'A':
-                DisplayDailySchedule(userInput, 'A')
-                DisplayCommands(DAILY_SCHEDULE_PAGE)
-                DailyScheduleInputEvent(userInput, 'A')
-            elif customFeatureChoice == 'B':
-                DisplayDailySchedule(userInput, 'B')
-                DisplayCommands(DAILY_SCHEDULE_PAGE)
-                DailyScheduleInputEvent(userInput, 'B')
+            session.currentDate = userInput
+            DisplayDailySchedule(userInput, session.customFeatureChoice, session.urgentFirst)
+            DisplayCommands(DAILY_SCHEDULE_PAGE)
+            return DAILY_SCHEDULE_PAGE
         elif userInput in ['mail', 'Mail', 'M']:
             DisplayEmailSupport()
             DisplayCommands(EMAIL_SUPPORT_PAGE)
-            MailAndTutorialInputEvent(customFeatureChoice)
-            break
+            return EMAIL_SUPPORT_PAGE
         elif userInput in ['tutorial', 'Tutorial', 'T']:
             DisplayTutorial()
             DisplayCommands(TUTORIAL_PAGE)
-            MailAndTutorialInputEvent(customFeatureChoice)
-            break
+            return TUTORIAL_PAGE
         elif userInput == 'Q' or userInput == 'quit':
             QuitProgram()
         else:
             print("Invalid input, try again.")
 
 
+# Input handler of every page. Each handler reads input until the user leaves the page, displays the
+# next page and returns its name; RunPages dispatches it from one loop instead of handlers calling
+# each other recursively.
+PAGE_INPUT_EVENTS = {
+    FEATURE_NEW_EXTENSIONS_PAGE: FeatureNewExtensionsInputEvent,
+    ADVANCED_OPTIONS_PAGE: AdvancedOptionsInputEvent,
+    FEATURES_INSTALLATION_PAGE: FeaturesInstallationInputEvent,
+    SCHEDULING_MANAGEMENT_SYSTEM_MAIN_PAGE: SchedulingManagementSystemMainInputEvent,
+    DAILY_SCHEDULE_PAGE: DailyScheduleInputEvent,
+    TUTORIAL_PAGE: MailAndTutorialInputEvent,
+    EMAIL_SUPPORT_PAGE: MailAndTutorialInputEvent,
+    ADD_TASK_PAGE: DailyAddTaskInputEvent,
+    CHANGE_PRIORITY_PAGE: DailyChangePriorityInputEvent,
+    MODIFY_TASK_PAGE: TaskModifyInputEvent,
+}
+
+
+def RunPages(session, page):
+    """
+    Runs the page state machine from page until a handler returns None.
+
+    Stack depth stays constant however many pages a session visits. When a
+    service cannot be reached, the user is told so and the page asks again.
+    """
+    while page is not None:
+        try:
+            page = PAGE_INPUT_EVENTS[page](session)
+        except (RpcUnavailableError, RpcTimeoutError) as e:
+            metrics.log_event(logger, logging.WARNING, 'service_unavailable', page=page, error=str(e))
+            print("Service unavailable, try again.")
+
+
 MondayTask = [Task('44', 1, 'Monday', 'urgent'),
               Task('55', 2, 'Monday', 'urgent'),
               Task('66', 3, 'Monday', 'non-urgent'),
@@ -871,12 +1015,273 @@ FridayTask = []
 SaturdayTask = []
 SundayTask = []
 
-weekTaskList = [MondayTask, TuesdayTask, WednesdayTask, ThursdayTask,
-                FridayTask, SaturdayTask, SundayTask]
+taskStore = None
+
+
+def get_task_store():
+    """
+    Returns the task store, opening it on first use.
+
+    On the first run the store is seeded with the sample schedule above.
+    Importing main therefore touches no files; the store is opened by the
+    first page or batch command that needs it.
+    """
+    global taskStore
+    if taskStore is None:
+        taskStore = open_task_store()
+        if taskStore.is_new():
+            # First run: seed the store with the sample schedule.
+            for weekIndex, dayTasks in enumerate([MondayTask, TuesdayTask, WednesdayTask, ThursdayTask,
+                                                  FridayTask, SaturdayTask, SundayTask]):
+                for task in dayTasks:
+                    taskStore.append(weekIndex, task)
+            taskStore.compact()
+        atexit.register(taskStore.close)
+    return taskStore
+
+
+# Commands understood in batch mode, see ParseBatchCommand.
+BATCH_COMMANDS = ['add', 'edit', 'delete', 'set-priority', 'set-priority-all', 'complete', 'reopen', 'show', 'stats']
+# Number of batch commands read ahead so their RPC calls can be pipelined together.
+BATCH_WINDOW = 256
+
+
+def ParseBatchCommand(line):
+    """
+    Parses one line of a batch command stream.
+
+    Lines look like 'add Monday Buy milk', 'edit Monday 2 Buy bread', 'delete Monday 2',
+    'set-priority Monday 2 urgent', 'set-priority-all Monday non-urgent urgent', 'complete Monday 2',
+    'reopen Monday 2', 'show Monday', 'show' or 'stats'. Task numbers are the ones the daily schedule
+    page shows; set-priority-all changes every task of the day that has the first priority to the
+    second, and reopen marks a completed task as not completed.
+
+    Returns:
+        tuple: (command, day index, task number, argument), with None for the parts a command
+        does not take, or None for blank lines and '#' comments.
+
+    Raises:
+        ValueError: If the line is not a valid command.
+    """
+    fields = line.strip().split(None, 1)
+    if not fields or fields[0].startswith('#'):
+        return None
+    command = fields[0]
+    if command not in BATCH_COMMANDS:
+        raise ValueError(f"unknown command '{command}'")
+    fields = fields[1].split(None, 1) if len(fields) > 1 else []
+    if command == 'stats':
+        if fields:
+            raise ValueError("'stats' takes no arguments")
+        return command, None, None, None
+    if not fields:
+        if command == 'show':
+            return command, None, None, None
+        raise ValueError(f"'{command}' needs a day")
+    day = DAY_ORDINALS.get(fields[0])
+    if day is None:
+        raise ValueError(f"unknown day '{fields[0]}'")
+    argument = fields[1] if len(fields) > 1 else ''
+    if command == 'show':
+        return command, day, None, None
+    if command == 'add':
+        return command, day, None, argument
+    if command == 'set-priority-all':
+        priorities = argument.split()
+        if len(priorities) != 2 or any(priority not in ['urgent', 'non-urgent'] for priority in priorities):
+            raise ValueError("'set-priority-all' needs two priorities, 'urgent' or 'non-urgent'")
+        return command, day, None, tuple(priorities)
+    fields = argument.split(None, 1)
+    if not fields or not fields[0].isnumeric():
+        raise ValueError(f"'{command}' needs a task number")
+    argument = fields[1] if len(fields) > 1 else ''
+    if command == 'set-priority' and argument not in ['urgent', 'non-urgent']:
+        raise ValueError("priority must be 'urgent' or 'non-urgent'")
+    if command in ['complete', 'reopen'] and argument:
+        raise ValueError(f"'{command}' takes only a day and a task number")
+    return command, day, int(fields[0]), argument
+
+
+class BatchRunner:
+    """
+    Applies a stream of batch commands to the task store without prompting.
+
+    Commands are read in windows. The contents added or edited in a window that
+    are not cached are checked by the StringValidator in one request, and the
+    edit, set-priority and delete requests of a window are pipelined per
+    service. They are flushed early when a command touches a task that already
+    has a request in flight, names a position on a day with a delete in
+    flight, or is 'show' or 'stats', so commands still take effect in order.
+    Completions only change the local store and are applied as they are read.
+    Deletes are not asked to be confirmed.
+
+    Attributes:
+        applied (int): Commands that took effect.
+        failed (int): Commands that were rejected, reported on stderr.
+    """
+
+    def __init__(self, window=BATCH_WINDOW):
+        self.window = window
+        self.applied = 0
+        self.failed = 0
+        self.stringValidator = StringValidatorClient()
+        self.clients = {'edit': EditClient(), 'delete': DeletionClient()}
+        self.pending = {}
+        self.deletingDays = set()
+
+    def run(self, lines):
+        """
+        Applies every command in lines and returns (applied, failed).
+        """
+        commands = []
+        for lineNumber, line in enumerate(lines, 1):
+            try:
+                command = ParseBatchCommand(line)
+            except ValueError as e:
+                # Reported when the window runs, so messages come out in line order.
+                command = e
+            if command is not None:
+                commands.append((lineNumber, command))
+            if len(commands) == self.window:
+                self.run_window(commands)
+                commands = []
+        self.run_window(commands)
+        return self.applied, self.failed
+
+    def run_window(self, commands):
+        taskStore = get_task_store()
+        contents = [command[3] for _, command in commands
+                    if not isinstance(command, ValueError) and command[0] in ['add', 'edit']]
+        try:
+            verdicts = iter(self.stringValidator.validate_many(contents, 0, 40))
+        except (RpcUnavailableError, RpcTimeoutError) as e:
+            # Every add and edit of the window is rejected; the other commands still run.
+            verdicts = iter([e] * len(contents))
+        for lineNumber, command in commands:
+            if isinstance(command, ValueError):
+                self.reject(lineNumber, command)
+                continue
+            command, day, number, argument = command
+            verdict = next(verdicts) if command in ['add', 'edit'] else None
+            if isinstance(verdict, Exception):
+                self.reject(lineNumber, verdict)
+            elif command in ['add', 'edit'] and verdict != "Just Right":
+                self.reject(lineNumber, "task content must be between 1 and 40 characters")
+            elif command == 'add':
+                taskStore.append(day, Task(argument, taskStore.count_for_day(day) + 1, WEEK_DAYS[day]))
+                self.applied += 1
+            elif command == 'set-priority-all':
+                self.flush()
+                try:
+                    SetDayPriority(day, *argument)
+                except (RuntimeError, RpcUnavailableError, RpcTimeoutError) as e:
+                    self.reject(lineNumber, e)
+                    continue
+                self.applied += 1
+            elif command == 'show':
+                self.flush()
+                for weekIndex in range(0, 7) if day is None else [day]:
+                    DisplayDailySchedule(WEEK_DAYS[weekIndex], 'A')
+                self.applied += 1
+            elif command == 'stats':
+                self.flush()
+                DisplayCompletionStats()
+                self.applied += 1
+            else:
+                if day in self.deletingDays:
+                    self.flush()
+                if not 1 <= number <= taskStore.count_for_day(day):
+                    self.reject(lineNumber, f"{WEEK_DAYS[day]} has no task {number}")
+                    continue
+                task = taskStore.task_at(day, number - 1)
+                if task.getId() in self.pending:
+                    self.flush()
+                    task = taskStore.task_at(day, number - 1)
+                if command in ['complete', 'reopen']:
+                    taskStore.complete(day, number - 1, command == 'complete')
+                    self.applied += 1
+                    continue
+                if command == 'edit':
+                    request = {'task': 'patch_task', 'changes': {'content': argument}}
+                elif command == 'set-priority':
+                    request = {'task': 'patch_task', 'changes': {'priority': argument}}
+                else:
+                    request = None
+                    self.deletingDays.add(day)
+                self.pending[task.getId()] = (lineNumber, command, task, request)
+        self.flush()
+
+    def flush(self):
+        """
+        Sends every pending request, one bulk message of edits and pipelined deletions, and applies
+        the results to the store.
+
+        Edits are made to copies of the stored tasks, which are put once their whole group has
+        succeeded, so a group that fails leaves the store as it last logged those tasks.
+        """
+        taskStore = get_task_store()
+        groups = {}
+        for lineNumber, command, task, request in self.pending.values():
+            groups.setdefault(command if command == 'delete' else 'edit', []).append((lineNumber, task, request))
+        self.pending = {}
+        self.deletingDays = set()
+        for command, group in groups.items():
+            tasks = [task if command == 'delete' else copy.copy(task) for _, task, _ in group]
+            try:
+                if command == 'delete':
+                    self.clients[command].delete_tasks(tasks)
+                else:
+                    self.clients[command].bulk_update([(task, request) for task, (_, _, request) in zip(tasks, group)])
+            except (RuntimeError, RpcUnavailableError, RpcTimeoutError) as e:
+                for lineNumber, _, _ in group:
+                    self.reject(lineNumber, e)
+                continue
+            for task in tasks:
+                if command == 'delete':
+                    taskStore.delete(*taskStore.locate(task.getId()))
+                else:
+                    taskStore.put(*taskStore.locate(task.getId()), task)
+            self.applied += len(group)
+
+    def reject(self, lineNumber, reason):
+        print(f"line {lineNumber}: {reason}", file=sys.stderr)
+        self.failed += 1
+
+
+def RunBatch(path, window=BATCH_WINDOW):
+    """
+    Applies the batch commands in the file at path, or stdin for '-', and reports throughput on stderr.
+
+    Returns:
+        int: The number of commands that failed.
+    """
+    stream = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    start = time.perf_counter()
+    with stream:
+        applied, failed = BatchRunner(window).run(stream)
+    elapsed = time.perf_counter() - start
+    total = applied + failed
+    print(f"{total} commands in {elapsed:.2f} s ({total / elapsed if elapsed else 0:,.0f} commands/s), "
+          f"{failed} failed", file=sys.stderr)
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Schedule Management System.')
+    parser.add_argument('--batch', metavar='FILE',
+                        help="apply the commands in FILE ('-' for stdin) instead of prompting; see ParseBatchCommand")
+    parser.add_argument('--window', type=int, default=BATCH_WINDOW,
+                        help='number of batch commands whose RPC calls are pipelined together')
+    args = parser.parse_args(argv)
+    metrics.configure_logging()
+    metrics.start_from_env()
+    if args.batch is not None:
+        sys.exit(1 if RunBatch(args.batch, args.window) else 0)
 
-while True:
     DisplayFeatureNewExtensions()
     DisplayCommands(FEATURE_NEW_EXTENSIONS_PAGE)
-    FeatureNewExtensionsInputEvent()
+    RunPages(Session(), FEATURE_NEW_EXTENSIONS_PAGE)
 
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from functools import partial
+
+# Port of the local metrics text endpoint; unset means no endpoint.
+METRICS_PORT_ENV = 'SMS_METRICS_PORT'
+# Seconds between dumps of every metric to the 'sms.metrics' logger; unset means no dumps.
+METRICS_DUMP_ENV = 'SMS_METRICS_DUMP'
+# Level of the structured log: DEBUG, INFO, WARNING (default) or ERROR.
+LOG_LEVEL_ENV = 'SMS_LOG_LEVEL'
+
+# Upper bounds, in seconds, of the latency histogram buckets: 1 us doubling up to about 67 s.
+BUCKET_BOUNDS = tuple(1e-6 * 2 ** exponent for exponent in range(27))
+# Observations buffered per histogram before they are sorted into buckets.
+FOLD_EVERY = 256
+
+_bucket_of = partial(bisect_left, BUCKET_BOUNDS)
+
+
+class Histogram:
+    """
+    Latency histogram with fixed exponential buckets.
+
+    Attributes:
+        counts (list): Observations per bucket of BUCKET_BOUNDS, plus one for anything larger.
+        count (int): Number of observations.
+        total (float): Sum of the observations in seconds.
+        max (float): Largest observation in seconds.
+    """
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe_many(self, samples):
+        """
+        Adds a batch of observations in seconds.
+        """
+        if not samples:
+            return
+        counts = self.counts
+        for bucket, bucket_count in Counter(map(_bucket_of, samples)).items():
+            counts[bucket] += bucket_count
+        self.count += len(samples)
+        self.total += sum(samples)
+        self.max = max(self.max, max(samples))
+
+    def quantile(self, fraction):
+        """
+        Returns the upper bound of the bucket holding the given fraction of observations, capped at max.
+        """
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bucket, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return min(BUCKET_BOUNDS[bucket], self.max) if bucket < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+
+class MetricsRegistry:
+    """
+    Counters and latency histograms keyed by metric name and RPC method.
+
+    Observing a duration only appends it to a buffer, well under a
+    microsecond; every FOLD_EVERY observations, and before metrics are read,
+    the buffer is sorted into the histogram buckets in one batch. Metrics are
+    read back as a dictionary with snapshot or as text with render_text, which
+    is what the endpoint and the periodic dump serve.
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, method, amount=1):
+        """
+        Adds amount to the counter name of method.
+        """
+        key = (name, method)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, method, seconds):
+        """
+        Records a duration in the histogram name of method.
+        """
+        samples = self._pending.get((name, method))
+        if samples is None:
+            with self._lock:
+                samples = self._pending.setdefault((name, method), [])
+                self._histograms.setdefault((name, method), Histogram())
+        samples.append(seconds)
+        if len(samples) >= FOLD_EVERY:
+            with self._lock:
+                self._fold((name, method), samples)
+
+    def _fold(self, key, samples):
+        # Only the samples present now are removed, so appends from other threads in between are kept.
+        count = len(samples)
+        batch = samples[:count]
+        del samples[:count]
+        self._histograms[key].observe_many(batch)
+
+    def timed(self, name, method):
+        """
+        Decorator recording the run time of every call of a function in the histogram name of method.
+        """
+        def decorate(function):
+            def measured(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe(name, method, time.perf_counter() - start)
+            measured.__name__ = function.__name__
+            measured.__doc__ = function.__doc__
+            return measured
+        return decorate
+
+    def snapshot(self):
+        """
+        Returns every counter and a summary of every histogram as a dictionary keyed by 'name{method}'.
+        """
+        with self._lock:
+            for key, samples in self._pending.items():
+                self._fold(key, samples)
+            counters = dict(self._counters)
+            histograms = {key: (histogram.count, histogram.total, histogram.max,
+                                histogram.quantile(0.5), histogram.quantile(0.9), histogram.quantile(0.99))
+                          for key, histogram in self._histograms.items()}
+        result = {f'{name}{{{method}}}': value for (name, method), value in counters.items()}
+        for (name, method), (count, total, maximum, p50, p90, p99) in histograms.items():
+            result[f'{name}{{{method}}}'] = {'count': count, 'sum': total, 'max': maximum,
+                                             'p50': p50, 'p90': p90, 'p99': p99}
+        return result
+
+    def render_text(self):
+        """
+        Returns every metric in the Prometheus text format, histograms as count, sum and quantiles.
+        """
+        lines = []
+        for key, value in sorted(self.snapshot().items()):
+            name, method = key[:-1].split('{', 1)
+            label = f'{{method="{method}"}}'
+            if isinstance(value, dict):
+                lines.append(f'{name}_count{label} {value["count"]}')
+                lines.append(f'{name}_sum{label} {value["sum"]:.6f}')
+                for quantile in ('p50', 'p90', 'p99'):
+                    lines.append(f'{name}{{method="{method}",quantile="0.{quantile[1:]}"}} {value[quantile]:.6f}')
+            else:
+                lines.append(f'{name}{label} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        """
+        Drops every metric.
+        """
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._pending.clear()
+
+
+# Metrics of this process.
+registry = MetricsRegistry()
+increment = registry.increment
+observe = registry.observe
+timed = registry.timed
+
+
+def serve_metrics(port, host='127.0.0.1'):
+    """
+    Serves registry.render_text() on http://host:port/metrics from a daemon thread and returns the server.
+    """
+    # http.server pulls in the email package; only processes that serve metrics pay for it.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') not in ('', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            log_event(logger, logging.DEBUG, 'metrics_request', path=self.path)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def dump_metrics_every(interval):
+    """
+    Logs registry.render_text() at INFO level every interval seconds from a daemon thread.
+    """
+    def dump():
+        while True:
+            time.sleep(interval)
+            logger.info('metrics\n%s', registry.render_text())
+
+    thread = threading.Thread(target=dump, daemon=True)
+    thread.start()
+    return thread
+
+
+_started = False
+
+
+def start_from_env(serve=True):
+    """
+    Starts the metrics endpoint and periodic dump configured by SMS_METRICS_PORT and SMS_METRICS_DUMP.
+
+    Only the first call has an effect. serve=False skips the endpoint, for worker processes that
+    cannot share its port.
+    """
+    global _started
+    if _started:
+        return
+    _started = True
+    port = os.environ.get(METRICS_PORT_ENV)
+    if serve and port:
+        serve_metrics(int(port))
+    interval = os.environ.get(METRICS_DUMP_ENV)
+    if interval:
+        dump_metrics_every(float(interval))
+
+
+def configure_logging(level=None):
+    """
+    Sends log records to stderr at the level given or set by SMS_LOG_LEVEL, WARNING by default.
+    """
+    logging.basicConfig(level=(level or os.environ.get(LOG_LEVEL_ENV, 'WARNING')).upper(),
+                        format='%(asctime)s %(levelname)s %(name)s %(message)s')
+
+
+def log_event(event_logger, level, event, **fields):
+    """
+    Logs an event with key=value fields, without formatting anything when level is disabled.
+    """
+    if event_logger.isEnabledFor(level):
+        event_logger.log(level, '%s %s', event, ' '.join(f'{key}={value!r}' for key, value in fields.items()))
+
+
+logger = logging.getLogger('sms.metrics')
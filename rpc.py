@@ -0,0 +1,642 @@
+import atexit
+import os
+import random
+import sys
+import time
+import uuid
+
+import codec
+import metrics
+
+RABBITMQ_HOST = 'localhost'
+
+# Selects the transport used by RpcClient: 'amqp' (default) or 'inprocess'.
+TRANSPORT_ENV = 'SMS_TRANSPORT'
+# Seconds a request waits for its reply before it is retried, and how many times it is retried.
+TIMEOUT_ENV = 'SMS_RPC_TIMEOUT'
+RETRIES_ENV = 'SMS_RPC_RETRIES'
+# What a client does once a service is unavailable: 'local' (default) runs the service's handler
+# in-process, 'none' raises RpcUnavailableError.
+FALLBACK_ENV = 'SMS_RPC_FALLBACK'
+
+
+def transport_errors():
+    """
+    Returns the exception types raised when the broker cannot be reached or the connection drops.
+
+    pika is only imported once a connection is opened, so before that only ConnectionError can occur.
+    """
+    pika = sys.modules.get('pika')
+    if pika is None:
+        return (ConnectionError,)
+    return (pika.exceptions.AMQPError, ConnectionError)
+
+
+class RpcTimeoutError(TimeoutError):
+    """
+    Raised when a reply does not arrive before its deadline.
+    """
+
+
+class RpcUnavailableError(ConnectionError):
+    """
+    Raised when a service cannot be reached and no fallback is configured.
+    """
+
+
+class RetryPolicy:
+    """
+    Deadline and retry settings for the requests sent to one queue.
+
+    Attributes:
+        timeout (float): Seconds to wait for each attempt's reply, or None to wait forever.
+        retries (int): Attempts made after the first one fails.
+        backoff (float): Base delay in seconds before a retry; doubles with every attempt.
+        max_backoff (float): Cap of the delay before a retry.
+    """
+
+    def __init__(self, timeout=5.0, retries=2, backoff=0.05, max_backoff=1.0):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def delay(self, attempt):
+        """
+        Returns the delay before retry number attempt, with full jitter so clients do not retry in step.
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+# Policies of queues whose requests need other deadlines than the default.
+RETRY_POLICIES = {
+    'StringValidation': RetryPolicy(timeout=2.0),
+    # A quit waits for every service to drain (SMS_SHUTDOWN_DEADLINE) and must not be sent twice.
+    'QuitQueue': RetryPolicy(timeout=30.0, retries=0),
+}
+
+
+# Queues never answered by the local fallback: a local QuitServer would report a shutdown no service received.
+NO_LOCAL_FALLBACK = ('QuitQueue',)
+
+
+def retry_policy(routing_key):
+    """
+    Returns the RetryPolicy of a queue, built from SMS_RPC_TIMEOUT and SMS_RPC_RETRIES unless it has its own.
+    """
+    policy = RETRY_POLICIES.get(routing_key)
+    if policy is None:
+        policy = RETRY_POLICIES[routing_key] = RetryPolicy(float(os.environ.get(TIMEOUT_ENV, 5.0)),
+                                                           int(os.environ.get(RETRIES_ENV, 2)))
+    return policy
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of one service so clients stop waiting on a service that is down.
+
+    The breaker opens after failure_threshold consecutive failed requests;
+    while open, requests fail fast without being sent. After reset_after
+    seconds it lets requests through again and closes on the first success or
+    opens again on the next failure.
+
+    Attributes:
+        failure_threshold (int): Consecutive failures that open the breaker.
+        reset_after (float): Seconds the breaker stays open before requests are tried again.
+        failures (int): Consecutive failures so far.
+        opened_at (float): When the breaker opened, or None while closed.
+    """
+
+    def __init__(self, failure_threshold=5, reset_after=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._clock = clock
+
+    def allow(self):
+        """
+        Returns True if a request may be sent now.
+        """
+        return self.opened_at is None or self._clock() - self.opened_at >= self.reset_after
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = self._clock()
+
+
+_breakers = {}
+
+
+def get_breaker(routing_key):
+    """
+    Returns the process-wide CircuitBreaker of a queue.
+    """
+    breaker = _breakers.get(routing_key)
+    if breaker is None:
+        breaker = _breakers[routing_key] = CircuitBreaker()
+    return breaker
+
+
+class ConnectionPool:
+    """
+    Process-wide RabbitMQ connection shared by every RPC client.
+
+    The pool lazily imports pika and opens one BlockingConnection, one channel
+    and one exclusive reply queue on the first request, and keeps them for the
+    lifetime of the process. Clients borrow
+    the channel to publish requests and register a handler for their
+    correlation id; replies arriving on the shared reply queue are routed back
+    to that handler.
+
+    Attributes:
+        host (str): The RabbitMQ host to connect to.
+        connection (pika.BlockingConnection): The shared connection, or None before first use.
+        channel: The shared channel, or None before first use.
+        callback_queue (str): Name of the long-lived exclusive reply queue.
+    """
+
+    def __init__(self, host=RABBITMQ_HOST):
+        self.host = host
+        self.connection = None
+        self.channel = None
+        self.callback_queue = None
+        self._handlers = {}
+
+    def acquire(self):
+        """
+        Returns the pool, (re)opening the connection, channel and reply queue if needed.
+        """
+        import pika
+        if self.connection is None or self.connection.is_closed:
+            self.connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.host))
+            self.channel = None
+        if self.channel is None or self.channel.is_closed:
+            self.channel = self.connection.channel()
+            result = self.channel.queue_declare(queue='', exclusive=True)
+            self.callback_queue = result.method.queue
+            self.channel.basic_consume(queue=self.callback_queue,
+                                       on_message_callback=self._on_response,
+                                       auto_ack=True)
+            self._handlers.clear()
+        return self
+
+    def _on_response(self, ch, method, props, body):
+        handler = self._handlers.pop(props.correlation_id, None)
+        if handler is not None:
+            handler(ch, method, props, body)
+
+    def publish(self, routing_key, body, corr_id, on_response, content_type=None):
+        """
+        Publishes a request on the shared channel with the shared reply queue as reply_to.
+
+        Args:
+            routing_key (str): The queue of the target microservice.
+            body (str | bytes): The request payload.
+            corr_id (str): Correlation id used to route the reply.
+            on_response (callable): pika-style callback invoked with the reply.
+            content_type (str): Content type of body, see codec, or None for legacy payloads.
+        """
+        import pika
+        self.acquire()
+        self._handlers[corr_id] = on_response
+        self.channel.basic_publish(exchange='',
+                                   routing_key=routing_key,
+                                   properties=pika.BasicProperties(
+                                       reply_to=self.callback_queue,
+                                       correlation_id=corr_id,
+                                       content_type=content_type,
+                                       # Lets the consumer measure how long the request waited in the queue.
+                                       headers={'sent_at': time.time()},
+                                   ),
+                                   body=body)
+
+    def cancel(self, corr_id):
+        """
+        Stops waiting for the reply to a request; a late reply is dropped.
+        """
+        self._handlers.pop(corr_id, None)
+
+    def process_data_events(self, time_limit=None):
+        """
+        Pumps the shared connection so pending replies are dispatched.
+        """
+        self.acquire().connection.process_data_events(time_limit=time_limit)
+
+    def close(self):
+        """
+        Closes the shared channel and connection. Safe to call more than once.
+        """
+        self._handlers.clear()
+        if self.connection is not None and self.connection.is_open:
+            self.connection.close()
+        self.connection = None
+        self.channel = None
+        self.callback_queue = None
+
+
+class RpcFuture:
+    """
+    Pending reply for one request sent through an RpcClient.
+
+    Attributes:
+        corr_id (str): Correlation id of the request.
+        body (bytes): The raw reply, or None while still pending.
+        content_type (str): Content type of the reply, or None if the server set none.
+    """
+
+    def __init__(self, pool, corr_id, decode=None):
+        self.pool = pool
+        self.corr_id = corr_id
+        self.decode = decode
+        self.body = None
+        self.content_type = None
+        self._done = False
+
+    def on_response(self, ch, method, props, body):
+        self.body = body
+        self.content_type = props.content_type
+        self._done = True
+
+    def done(self):
+        """
+        Returns True once the reply has arrived.
+        """
+        return self._done
+
+    def cancel(self):
+        """
+        Stops waiting for the reply; a late reply is dropped.
+        """
+        self.pool.cancel(self.corr_id)
+
+    def result(self, timeout=None):
+        """
+        Blocks until the reply arrives and returns it, decoded if a decoder was given.
+
+        Replies for other in-flight requests that arrive in the meantime are
+        dispatched to their own futures.
+
+        Raises:
+            RpcTimeoutError: If timeout seconds pass without a reply.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._done:
+            if deadline is None:
+                self.pool.process_data_events(time_limit=None)
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # A reply that has already arrived still counts.
+                self.pool.process_data_events(time_limit=0)
+                if self._done:
+                    break
+                self.pool.cancel(self.corr_id)
+                raise RpcTimeoutError(f"No reply to request {self.corr_id} within {timeout} s")
+            self.pool.process_data_events(time_limit=remaining)
+        if self.decode is None:
+            return self.body
+        return self.decode(self.body)
+
+
+class AmqpTransport:
+    """
+    Transport that sends requests through RabbitMQ on the shared ConnectionPool.
+    """
+
+    def __init__(self, pool=None):
+        self.pool = pool if pool is not None else get_pool()
+
+    def send(self, routing_key, body, decode=None, content_type=None):
+        """
+        Publishes a request body to a service queue and returns an RpcFuture for its reply.
+        """
+        corr_id = str(uuid.uuid4())
+        future = RpcFuture(self.pool, corr_id, decode)
+        self.pool.publish(routing_key, body, corr_id, future.on_response, content_type)
+        return future
+
+
+# Queues that answered a binary request in another format; they are sent JSON from then on.
+_json_only_routes = set()
+
+
+class NegotiatedFuture:
+    """
+    Future for a request encoded with codec, falling back to JSON for services without binary support.
+
+    The request is sent in the client's content type. If a binary request is
+    answered in anything but binary, the service is remembered as JSON-only
+    and the request is sent again as JSON.
+    """
+
+    def __init__(self, client, request, content_type, transport):
+        self.client = client
+        self.request = request
+        self.content_type = content_type
+        self.transport = transport
+        self._future = self._send()
+
+    def _send(self):
+        return self.transport.send(self.client.routing_key, codec.encode(self.request, self.content_type),
+                                   None, self.content_type)
+
+    def done(self):
+        return self._future.done()
+
+    def cancel(self):
+        self._future.cancel()
+
+    def result(self, timeout=None):
+        body = self._future.result(timeout)
+        if self.content_type == codec.BINARY and self._future.content_type != codec.BINARY:
+            _json_only_routes.add(self.client.routing_key)
+            self.content_type = codec.JSON
+            self._future = self._send()
+            body = self._future.result(timeout)
+        return codec.decode(body, self._future.content_type)
+
+
+class FailedFuture:
+    """
+    Future for a request that could not be sent; result raises the error.
+    """
+
+    def __init__(self, error):
+        self.error = error
+
+    def done(self):
+        return True
+
+    def result(self, timeout=None):
+        raise self.error
+
+
+class ResilientFuture:
+    """
+    Future that bounds the wait for a reply and retries failed requests.
+
+    Each attempt has a deadline of the client's policy timeout counted from
+    when it was sent, so pipelined requests time out together rather than one
+    after another. A timeout or a broker error counts as a failure of the
+    service's circuit breaker and the request is sent again after a jittered
+    backoff, up to policy.retries times. When the attempts run out, or the
+    breaker is open by the time an attempt is waited on, the client's
+    fallback answers instead.
+    """
+
+    def __init__(self, client, request):
+        self.client = client
+        self.request = request
+        self.attempt = 0
+        self._send()
+
+    def _send(self):
+        self._deadline = time.monotonic() + self.client.policy.timeout
+        try:
+            self._future = self.client.dispatch(self.request, self.client.transport)
+        except transport_errors() as e:
+            self._future = FailedFuture(e)
+
+    def done(self):
+        return self._future.done()
+
+    def result(self, timeout=None):
+        policy = self.client.policy
+        breaker = self.client.breaker
+        while True:
+            if not self._future.done() and not breaker.allow():
+                # Other requests opened the breaker while this one was in flight; do not wait for it.
+                cancel = getattr(self._future, 'cancel', None)
+                if cancel is not None:
+                    cancel()
+                return self.client.fallback(
+                    self.request, RpcUnavailableError(f"Circuit for {self.client.routing_key} is open")).result()
+            try:
+                result = self._future.result(max(0.0, self._deadline - time.monotonic()))
+            except transport_errors() + (RpcTimeoutError,) as e:
+                breaker.record_failure()
+                metrics.increment('rpc_client_failures_total', self.client.routing_key)
+                pool = getattr(self.client.transport, 'pool', None)
+                if not isinstance(e, RpcTimeoutError) and pool is not None:
+                    # The connection is broken; the next attempt reconnects.
+                    pool.close()
+                if self.attempt >= policy.retries or not breaker.allow():
+                    return self.client.fallback(self.request, e).result()
+                time.sleep(policy.delay(self.attempt))
+                self.attempt += 1
+                self._send()
+                continue
+            breaker.record_success()
+            return result
+
+
+class TimedFuture:
+    """
+    Wraps a reply future and records the client call time of its request the first time it is resolved.
+    """
+
+    __slots__ = ('_future', '_method', '_start', '_observed')
+
+    def __init__(self, future, method, start):
+        self._future = future
+        self._method = method
+        self._start = start
+        self._observed = False
+
+    def done(self):
+        return self._future.done()
+
+    def result(self, timeout=None):
+        result = self._future.result(timeout)
+        if not self._observed:
+            self._observed = True
+            metrics.observe('rpc_client_seconds', self._method, time.perf_counter() - self._start)
+        return result
+
+
+def rpc_method(routing_key, request):
+    """
+    Returns the metrics label of a request: its queue, followed by its 'task' field when it has one.
+    """
+    if isinstance(request, dict) and 'task' in request:
+        return f"{routing_key}.{request['task']}"
+    return routing_key
+
+
+class RpcClient:
+    """
+    Multiplexed RPC client for one microservice queue.
+
+    Every request gets its own correlation id and RpcFuture, and all replies
+    come back on the pool's shared reply queue, so any number of requests can
+    be in flight at once. Subclasses override build_request to turn call
+    arguments into the request for a particular service.
+
+    Attributes:
+        routing_key (str): The queue of the target microservice.
+        encode (callable): Turns a request into a message body, or None to send it as-is.
+        decode (callable): Turns a reply body into a result, or None to return raw bytes.
+        content_type (str): When set, requests and replies go through codec in this content
+            type, with JSON fallback, and encode/decode are ignored.
+        transport: Backend that delivers requests, see get_transport.
+        policy (RetryPolicy): Deadline and retries of each request, see retry_policy.
+        breaker (CircuitBreaker): Health of the service, shared by every client of the queue.
+    """
+
+    def __init__(self, routing_key, encode=None, decode=None, transport=None, content_type=None, policy=None):
+        self.routing_key = routing_key
+        self.encode = encode
+        self.decode = decode
+        self.content_type = content_type
+        self.transport = transport if transport is not None else get_transport()
+        self.policy = policy if policy is not None else retry_policy(routing_key)
+        self.breaker = get_breaker(routing_key)
+
+    def build_request(self, request):
+        """
+        Builds the request object sent for the given call arguments.
+        """
+        return request
+
+    def send(self, request):
+        """
+        Sends an already built request and returns a future for its reply.
+
+        Requests to a service whose circuit breaker is open go straight to the fallback. The
+        time from sending to the reply being resolved is recorded as rpc_client_seconds.
+        """
+        start = time.perf_counter()
+        if self.breaker.allow():
+            future = ResilientFuture(self, request)
+        else:
+            future = self.fallback(request, RpcUnavailableError(f"Circuit for {self.routing_key} is open"))
+        return TimedFuture(future, rpc_method(self.routing_key, request), start)
+
+    def dispatch(self, request, transport):
+        """
+        Encodes a request and hands it to transport, returning the transport's future.
+        """
+        if self.content_type is not None:
+            if self.routing_key in _json_only_routes:
+                content_type = codec.JSON
+            else:
+                content_type = codec.request_content_type(request, self.content_type)
+            return NegotiatedFuture(self, request, content_type, transport)
+        body = request if self.encode is None else self.encode(request)
+        return transport.send(self.routing_key, body, self.decode)
+
+    def fallback(self, request, error):
+        """
+        Returns a future answering a request the service could not, as chosen by SMS_RPC_FALLBACK.
+
+        'local' runs the service's handler in this process, except for the queues in NO_LOCAL_FALLBACK;
+        'none' fails with RpcUnavailableError.
+        """
+        metrics.increment('rpc_client_fallbacks_total', self.routing_key)
+        if (os.environ.get(FALLBACK_ENV, 'local') == 'local' and self.routing_key not in NO_LOCAL_FALLBACK
+                and self.transport is not _local_transport()):
+            return self.dispatch(request, _local_transport())
+        unavailable = RpcUnavailableError(f"{self.routing_key} is unavailable: {error}")
+        unavailable.__cause__ = error
+        return FailedFuture(unavailable)
+
+    def call_async(self, *args, **kwargs):
+        """
+        Sends a request without waiting and returns an RpcFuture for its reply.
+        """
+        return self.send(self.build_request(*args, **kwargs))
+
+    def call(self, *args, **kwargs):
+        """
+        Sends a request and blocks until its reply arrives.
+        """
+        return self.call_async(*args, **kwargs).result()
+
+    def call_many(self, requests):
+        """
+        Pipelines a batch of built requests and returns their results in order.
+        """
+        return gather([self.send(request) for request in requests])
+
+    def close(self):
+        """
+        Releases the client. The shared connection stays open for other clients.
+        """
+
+
+def gather(futures):
+    """
+    Waits for every future and returns their results in the same order.
+    """
+    return [future.result() for future in futures]
+
+
+_pool = None
+
+
+def get_pool():
+    """
+    Returns the process-wide ConnectionPool, creating it on first use.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool()
+    return _pool
+
+
+def close_pool():
+    """
+    Closes the process-wide ConnectionPool if one was opened.
+    """
+    if _pool is not None:
+        _pool.close()
+
+
+_transport = None
+_fallback_transport = None
+
+
+def _local_transport():
+    global _fallback_transport
+    if _fallback_transport is None:
+        from inprocess_transport import InProcessTransport
+        _fallback_transport = InProcessTransport()
+    return _fallback_transport
+
+
+def get_transport():
+    """
+    Returns the process-wide transport chosen by the SMS_TRANSPORT environment variable.
+
+    'amqp' (the default) talks to the services through RabbitMQ. 'inprocess'
+    calls the service handlers directly, for single-host deployments without
+    a broker.
+    """
+    global _transport
+    if _transport is None:
+        name = os.environ.get(TRANSPORT_ENV, 'amqp')
+        if name == 'amqp':
+            _transport = AmqpTransport()
+        elif name == 'inprocess':
+            from inprocess_transport import InProcessTransport
+            _transport = InProcessTransport()
+        else:
+            raise ValueError(f"Unknown transport '{name}', expected 'amqp' or 'inprocess'")
+    return _transport
+
+
+def set_transport(transport):
+    """
+    Overrides the process-wide transport, e.g. with an InProcessTransport.
+    """
+    global _transport
+    _transport = transport
+
+
+atexit.register(close_pool)
@@ -0,0 +1,223 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter
+
+import metrics
+from rpc import RABBITMQ_HOST
+
+# Fanout exchange every service consumer listens on for control messages.
+CONTROL_EXCHANGE = 'sms.control'
+SHUTDOWN_MESSAGE = b'shutdown'
+# Seconds the services get to drain and acknowledge a shutdown broadcast.
+SHUTDOWN_DEADLINE = float(os.environ.get('SMS_SHUTDOWN_DEADLINE', 10.0))
+# Queues whose consumers must acknowledge a shutdown.
+SHUTDOWN_SERVICES = ('EditQueue', 'DeletionQueue', 'StringValidation')
+
+logger = logging.getLogger('sms.server_runner')
+
+
+def measure_queue_wait(queue, on_message_callback):
+    """
+    Wraps a pika message handler to record how long each request waited in the queue.
+
+    The wait is taken from the 'sent_at' header set by rpc.ConnectionPool.publish and recorded
+    as rpc_queue_wait_seconds; requests without the header are passed through unmeasured.
+    """
+    def on_message(ch, method, props, body):
+        sent_at = (props.headers or {}).get('sent_at')
+        if sent_at is not None:
+            metrics.observe('rpc_queue_wait_seconds', queue, max(0.0, time.time() - sent_at))
+        on_message_callback(ch, method, props, body)
+    return on_message
+
+
+def consume(queue, on_message_callback, prefetch_count=1, host=RABBITMQ_HOST):
+    """
+    Runs one blocking consumer for a queue on its own connection.
+
+    Args:
+        queue (str): The queue to consume from.
+        on_message_callback (callable): pika-style message handler.
+        prefetch_count (int): How many unacknowledged messages the broker may push to this consumer.
+        host (str): The RabbitMQ host to connect to.
+    """
+    import pika
+    if multiprocessing.parent_process() is not None:
+        # A worker process has its own metrics; it can dump them but not share the parent's endpoint.
+        metrics.start_from_env(serve=False)
+    connection = pika.BlockingConnection(pika.ConnectionParameters(host=host))
+    channel = connection.channel()
+    channel.queue_declare(queue=queue)
+    channel.basic_qos(prefetch_count=prefetch_count)
+    consumer_tag = channel.basic_consume(queue=queue,
+                                         on_message_callback=measure_queue_wait(queue, on_message_callback))
+    listen_for_shutdown(channel, {queue: consumer_tag})
+    channel.start_consuming()
+    connection.close()
+
+
+def drain(channel, consumers, sent_at):
+    """
+    Cancels the consumers of a channel and returns an acknowledgement for each of their queues.
+
+    pika runs the callbacks of a channel one at a time, so whoever calls this
+    from a callback knows the requests in progress have already been answered
+    and acked. Cancelling hands requests prefetched but not started back to
+    the queue for the next run.
+
+    Args:
+        channel: The channel the consumers run on.
+        consumers (dict): Queue name to consumer tag.
+        sent_at (float): When the shutdown was requested, as a time.time() timestamp.
+
+    Returns:
+        list: Dictionaries with 'queue', 'worker' and 'drain_seconds'.
+    """
+    acks = []
+    for queue, consumer_tag in consumers.items():
+        channel.basic_cancel(consumer_tag)
+        drain_seconds = max(0.0, time.time() - sent_at)
+        metrics.observe('rpc_server_drain_seconds', queue, drain_seconds)
+        metrics.log_event(logger, logging.INFO, 'drained', queue=queue, seconds=round(drain_seconds, 6))
+        acks.append({'queue': queue, 'worker': f'{os.getpid()}/{threading.current_thread().name}',
+                     'drain_seconds': drain_seconds})
+    return acks
+
+
+def listen_for_shutdown(channel, consumers):
+    """
+    Makes the consumers of a channel stop cleanly when a shutdown is broadcast on CONTROL_EXCHANGE.
+
+    The consumers, given as a queue to consumer tag mapping, are drained and
+    the broadcaster is sent one acknowledgement per queue, carrying the drain
+    time, before consuming stops.
+    """
+    import pika
+    channel.exchange_declare(exchange=CONTROL_EXCHANGE, exchange_type='fanout')
+    control_queue = channel.queue_declare(queue='', exclusive=True).method.queue
+    channel.queue_bind(exchange=CONTROL_EXCHANGE, queue=control_queue)
+
+    def on_control(ch, method, props, body):
+        if body != SHUTDOWN_MESSAGE:
+            return
+        for ack in drain(ch, consumers, (props.headers or {}).get('sent_at', time.time())):
+            ch.basic_publish(exchange='', routing_key=props.reply_to,
+                             properties=pika.BasicProperties(correlation_id=props.correlation_id),
+                             body=json.dumps(ack))
+        ch.stop_consuming()
+
+    channel.basic_consume(queue=control_queue, on_message_callback=on_control, auto_ack=True)
+
+
+def broadcast_shutdown(deadline=SHUTDOWN_DEADLINE, services=SHUTDOWN_SERVICES, host=RABBITMQ_HOST):
+    """
+    Tells every service consumer to stop and waits for their acknowledgements.
+
+    The broker's consumer count of each queue in services, taken just before
+    the broadcast, is the number of workers expected to acknowledge it.
+    Returns once all of them have or deadline seconds have passed, whichever
+    is first.
+
+    Returns:
+        tuple: The acknowledgements received, dictionaries with 'queue', 'worker' and
+        'drain_seconds', and the list of services that had no consumers or of which
+        fewer workers acknowledged in time than were consuming.
+    """
+    import pika
+    connection = pika.BlockingConnection(pika.ConnectionParameters(host=host))
+    try:
+        channel = connection.channel()
+        channel.exchange_declare(exchange=CONTROL_EXCHANGE, exchange_type='fanout')
+        expected = {service: channel.queue_declare(queue=service).method.consumer_count for service in services}
+        reply_queue = channel.queue_declare(queue='', exclusive=True).method.queue
+        acks = []
+        channel.basic_consume(queue=reply_queue, auto_ack=True,
+                              on_message_callback=lambda ch, method, props, body: acks.append(json.loads(body)))
+        channel.basic_publish(exchange=CONTROL_EXCHANGE, routing_key='', body=SHUTDOWN_MESSAGE,
+                              properties=pika.BasicProperties(reply_to=reply_queue, headers={'sent_at': time.time()}))
+        end = time.monotonic() + deadline
+        while any(Counter(ack['queue'] for ack in acks)[service] < count for service, count in expected.items()):
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            connection.process_data_events(time_limit=remaining)
+    finally:
+        connection.close()
+    acked = Counter(ack['queue'] for ack in acks)
+    missing = [service for service in services if acked[service] < max(expected[service], 1)]
+    if missing:
+        metrics.log_event(logger, logging.WARNING, 'shutdown_timeout', missing=missing, deadline=deadline)
+    return acks, missing
+
+
+def run_server(queue, on_message_callback, workers=1, prefetch_count=1, use_processes=False, stateful=False):
+    """
+    Starts a number of consumers for a queue and blocks until they stop.
+
+    pika connections are not thread-safe, so every worker opens its own
+    connection and channel. Threads are enough when handlers wait on I/O;
+    processes spread CPU-bound handlers across cores. Services that keep
+    task state in memory (see task_table) must run their workers as threads,
+    since a task registered with one process would be unknown to the others.
+
+    Args:
+        queue (str): The queue to consume from.
+        on_message_callback (callable): pika-style message handler, module level when using processes.
+        workers (int): Number of consumers to run.
+        prefetch_count (int): Prefetch window of each consumer.
+        use_processes (bool): Run consumers in processes instead of threads.
+        stateful (bool): The handler keeps state in this process, so workers must share it.
+
+    Raises:
+        ValueError: If a stateful service is asked to run several worker processes.
+    """
+    if stateful and use_processes and workers > 1:
+        raise ValueError(f"{queue} keeps its task table in memory; run its workers as threads")
+    metrics.configure_logging()
+    metrics.start_from_env()
+    print(f" [x] Awaiting RPC requests on {queue} "
+          f"({workers} {'process' if use_processes else 'thread'} workers, prefetch {prefetch_count})")
+    if workers <= 1:
+        consume(queue, on_message_callback, prefetch_count)
+        return
+
+    args = (queue, on_message_callback, prefetch_count)
+    if use_processes:
+        consumers = [multiprocessing.Process(target=consume, args=args) for _ in range(workers)]
+    else:
+        consumers = [threading.Thread(target=consume, args=args, daemon=True) for _ in range(workers)]
+    for consumer in consumers:
+        consumer.start()
+    try:
+        while any(consumer.is_alive() for consumer in consumers):
+            for consumer in consumers:
+                consumer.join(timeout=0.5)
+    except KeyboardInterrupt:
+        if use_processes:
+            for consumer in consumers:
+                consumer.terminate()
+
+
+def parse_server_args(description, stateful=False):
+    """
+    Parses the worker count and prefetch flags shared by every service.
+
+    Services with stateful=True keep their task table in memory, so --processes is rejected for them.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of consumers to run (default: 1)')
+    parser.add_argument('--prefetch', type=int, default=1,
+                        help='unacknowledged messages each consumer may hold (default: 1)')
+    parser.add_argument('--processes', action='store_true',
+                        help='run consumers in separate processes instead of threads')
+    args = parser.parse_args()
+    if stateful and args.processes and args.workers > 1:
+        parser.error('--processes cannot be used: this service keeps its task table in memory, '
+                     'so every worker must run as a thread of one process')
+    return args
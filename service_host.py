@@ -0,0 +1,110 @@
+import argparse
+import time
+from functools import partial
+
+import DeletionServer
+import EditServer
+import QuitServer
+import StringValidator
+import metrics
+from rpc import RABBITMQ_HOST
+from server_runner import SHUTDOWN_SERVICES, broadcast_shutdown, drain, listen_for_shutdown, measure_queue_wait
+
+# Message handler of every service queue the host can serve.
+HOSTED_ROUTES = {
+    'StringValidation': StringValidator.callback,
+    'EditQueue': EditServer.on_request,
+    'DeletionQueue': DeletionServer.on_request,
+    'QuitQueue': QuitServer.quit_callback,
+}
+
+
+class ServiceHost:
+    """
+    Runs the consumers of several services in one process, on one connection and one channel.
+
+    Each hosted queue is routed to the same handler its own service script
+    uses, so requests are answered exactly as before, and EditServer and
+    DeletionServer share one task table. pika runs the callbacks of the
+    channel one at a time in a single event loop. A quit received on a hosted
+    QuitQueue drains the hosted services directly and broadcasts the shutdown
+    only to services running elsewhere; a shutdown broadcast by a QuitServer
+    elsewhere drains the host like any other service.
+
+    Attributes:
+        queues (list): The hosted queues, keys of HOSTED_ROUTES.
+        prefetch_count (int): Prefetch window of each queue's consumer.
+        host (str): The RabbitMQ host to connect to.
+        channel: The shared channel, or None before start.
+        consumers (dict): Queue name to consumer tag of every hosted queue.
+    """
+
+    def __init__(self, queues=None, prefetch_count=1, host=RABBITMQ_HOST):
+        self.queues = list(HOSTED_ROUTES) if queues is None else list(queues)
+        unknown = [queue for queue in self.queues if queue not in HOSTED_ROUTES]
+        if unknown:
+            raise ValueError(f"Cannot host unknown queues {unknown}")
+        self.prefetch_count = prefetch_count
+        self.host = host
+        self.connection = None
+        self.channel = None
+        self.consumers = {}
+
+    def start(self):
+        """
+        Opens the connection and channel and registers a consumer for every hosted queue.
+        """
+        import pika
+        self.connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.host))
+        self.channel = self.connection.channel()
+        self.channel.basic_qos(prefetch_count=self.prefetch_count)
+        for queue in self.queues:
+            callback = HOSTED_ROUTES[queue]
+            if queue == 'QuitQueue':
+                callback = partial(callback, shutdown=self.shutdown)
+            self.channel.queue_declare(queue=queue)
+            self.consumers[queue] = self.channel.basic_consume(
+                queue=queue, on_message_callback=measure_queue_wait(queue, callback))
+        listen_for_shutdown(self.channel, {queue: consumer_tag for queue, consumer_tag in self.consumers.items()
+                                           if queue != 'QuitQueue'})
+        return self
+
+    def shutdown(self):
+        """
+        Drains the hosted services and stops those running elsewhere, see server_runner.broadcast_shutdown.
+        """
+        acks = drain(self.channel, {queue: consumer_tag for queue, consumer_tag in self.consumers.items()
+                                    if queue in SHUTDOWN_SERVICES}, time.time())
+        missing = []
+        elsewhere = [service for service in SHUTDOWN_SERVICES if service not in self.consumers]
+        if elsewhere:
+            remote_acks, missing = broadcast_shutdown(services=elsewhere)
+            acks += remote_acks
+        return acks, missing
+
+    def run(self):
+        """
+        Serves the hosted queues until a quit or a shutdown broadcast stops them.
+        """
+        self.start()
+        print(f" [x] Hosting {', '.join(self.queues)} on one connection (prefetch {self.prefetch_count})")
+        try:
+            self.channel.start_consuming()
+        finally:
+            self.connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs several microservices in one process.")
+    parser.add_argument('--queues', default=','.join(HOSTED_ROUTES),
+                        help='comma separated queues to host (default: all of them)')
+    parser.add_argument('--prefetch', type=int, default=1,
+                        help='unacknowledged messages each queue may hold (default: 1)')
+    args = parser.parse_args(argv)
+    metrics.configure_logging()
+    metrics.start_from_env()
+    ServiceHost(args.queues.split(','), args.prefetch).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+from array import array
+
+WEEK_DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+class Task:
+    """
+    Represents a task in the scheduling management system.
+
+    Attributes:
+        content (str): The description of the task.
+        index (int): The index position of the task within a day.
+        belong_week (str): The day of the week the task belongs to.
+        priority (str): The priority of the task, default is 'non-urgent'.
+        task_id (int): Stable id assigned by the task store, or None until stored.
+        completed (bool): Whether the task has been completed, default is False.
+    """
+
+    __slots__ = ('_content', '_index', '_belong_week', '_priority', '_id', '_completed')
+
+    def __init__(self, content, index, belong_week, priority='non-urgent', task_id=None, completed=False):
+        """
+        Initializes the Task with content, index, belonging week, priority, id and completion status.
+        """
+        self._content = content
+        self._index = index
+        self._belong_week = belong_week
+        self._priority = priority
+        self._id = task_id
+        self._completed = completed
+
+    def getContent(self):
+        """
+        Returns the content of the task.
+        """
+        return self._content
+
+    def getIndex(self):
+        """
+        Returns the index of the task.
+        """
+        return self._index
+
+    def getPriority(self):
+        """
+        Returns the priority of the task.
+        """
+        return self._priority
+
+    def getBelongWeek(self):
+        """
+        Returns the week day the task belongs to.
+        """
+        return self._belong_week
+
+    def getId(self):
+        """
+        Returns the stable id of the task, or None if it has not been stored yet.
+        """
+        return self._id
+
+    def isCompleted(self):
+        """
+        Returns True if the task has been completed.
+        """
+        return self._completed
+
+    def setId(self, task_id):
+        """
+        Sets the stable id of the task.
+        """
+        self._id = task_id
+
+    def setContent(self, content):
+        """
+        Sets the content of the task.
+        """
+        self._content = content
+
+    def setPriority(self, priority):
+        """
+        Sets the priority of the task.
+        """
+        self._priority = priority
+
+    def setCompleted(self, completed):
+        """
+        Sets the completion status of the task.
+        """
+        self._completed = completed
+
+    def toDict(self):
+        """
+        Returns the task as a dictionary keyed by attribute name, as the servers send it back.
+        """
+        return {
+            '_content': self._content,
+            '_index': self._index,
+            '_belong_week': self._belong_week,
+            '_priority': self._priority
+        }
+
+
+# Task fields that can change after creation, and so appear in task patches.
+MUTABLE_FIELDS = ('content', 'priority')
+
+
+def task_fields(task):
+    """
+    Returns the mutable fields of a task as a dictionary.
+    """
+    return {'content': task.getContent(), 'priority': task.getPriority()}
+
+
+def apply_task_changes(task, changes):
+    """
+    Applies a dictionary of changed mutable fields to a task in place and returns it.
+    """
+    if 'content' in changes:
+        task.setContent(changes['content'])
+    if 'priority' in changes:
+        task.setPriority(changes['priority'])
+    return task
+
+
+def task_to_dict(task):
+    """
+    Converts a Task object to the dictionary sent in requests.
+    """
+    return {
+        'content': task.getContent(),
+        'index': task.getIndex(),
+        'belong_week': task.getBelongWeek(),
+        'priority': task.getPriority()
+    }
+
+
+def dict_to_task(task_dict):
+    """
+    Converts a dictionary returned by a server to a Task object.
+    """
+    content = task_dict.get('_content')
+    index = task_dict.get('_index')
+    belong_week = task_dict.get('_belong_week')
+    priority = task_dict.get('_priority', 'non-urgent')  # Default to 'non-urgent' if not provided
+
+    return Task(content, index, belong_week, priority)
+
+
+class WeekColumns:
+    """
+    Column-oriented container for a large number of tasks.
+
+    Instead of one object per task, each field is kept in its own compact
+    column: the day as a one-byte ordinal, the index as a machine integer,
+    the priority as a one-byte code into a small table of interned priority
+    strings, and the content as an id into a string table, so repeated
+    contents are stored once. Task objects are only built on access.
+
+    Attributes:
+        days (array): Day ordinal of every row, 0 for Monday.
+        indexes (array): Task index of every row.
+        priority_codes (array): Priority code of every row.
+        content_ids (array): Content string table id of every row.
+        priorities (list): Priority strings by code.
+        contents (list): Content strings by id.
+    """
+
+    def __init__(self):
+        self.days = array('b')
+        self.indexes = array('i')
+        self.priority_codes = array('B')
+        self.content_ids = array('I')
+        self.priorities = []
+        self.contents = []
+        self._priority_lookup = {}
+        self._content_lookup = {}
+
+    def __len__(self):
+        return len(self.days)
+
+    def append(self, content, index, day_index, priority='non-urgent'):
+        """
+        Adds a task row and returns its row number.
+        """
+        self.days.append(day_index)
+        self.indexes.append(index)
+        self.priority_codes.append(self._intern(priority, self.priorities, self._priority_lookup))
+        self.content_ids.append(self._intern(content, self.contents, self._content_lookup))
+        return len(self.days) - 1
+
+    def append_task(self, task):
+        """
+        Adds a Task object as a row and returns its row number.
+        """
+        return self.append(task.getContent(), task.getIndex(),
+                           WEEK_DAYS.index(task.getBelongWeek()), task.getPriority())
+
+    def task(self, row):
+        """
+        Builds the Task object stored at a row.
+        """
+        return Task(self.contents[self.content_ids[row]], self.indexes[row],
+                    WEEK_DAYS[self.days[row]], self.priorities[self.priority_codes[row]])
+
+    def set_content(self, row, content):
+        """
+        Changes the content of a row.
+        """
+        self.content_ids[row] = self._intern(content, self.contents, self._content_lookup)
+
+    def set_priority(self, row, priority):
+        """
+        Changes the priority of a row.
+        """
+        self.priority_codes[row] = self._intern(priority, self.priorities, self._priority_lookup)
+
+    def rows_for_day(self, day_index):
+        """
+        Returns the row numbers of a day in insertion order.
+        """
+        return [row for row, day in enumerate(self.days) if day == day_index]
+
+    def to_week(self):
+        """
+        Returns the rows as seven lists of Task objects, in the shape of main.weekTaskList.
+        """
+        week = [[] for _ in WEEK_DAYS]
+        for row in range(len(self.days)):
+            week[self.days[row]].append(self.task(row))
+        return week
+
+    @classmethod
+    def from_week(cls, week):
+        """
+        Builds a WeekColumns from seven lists of Task objects.
+        """
+        columns = cls()
+        for day_index, day_tasks in enumerate(week):
+            for task in day_tasks:
+                columns.append(task.getContent(), task.getIndex(), day_index, task.getPriority())
+        return columns
+
+    @staticmethod
+    def _intern(value, table, lookup):
+        code = lookup.get(value)
+        if code is None:
+            code = len(table)
+            table.append(value)
+            lookup[value] = code
+        return code
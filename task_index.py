@@ -0,0 +1,285 @@
+from bisect import bisect_left, insort
+from itertools import chain
+
+from task import WEEK_DAYS
+
+# Ordinal of every day name, 0 for Monday.
+DAY_ORDINALS = {day: ordinal for ordinal, day in enumerate(WEEK_DAYS)}
+# The priority listed first by priority-ordered views.
+URGENT = 'urgent'
+# Longest run of a SortedSlots before it is split in two.
+RUN_MAX = 1024
+
+
+def day_ordinal(day):
+    """
+    Returns the ordinal of a day name, 0 for Monday.
+
+    Raises:
+        ValueError: If day is not a day name.
+    """
+    ordinal = DAY_ORDINALS.get(day)
+    if ordinal is None:
+        raise ValueError(f"Unknown day '{day}'")
+    return ordinal
+
+
+class TaskIndex:
+    """
+    Maps stable task ids to their task object and to the (day, position) slot holding it.
+
+    The task store keeps the index up to date on every add and replacement, so
+    a task is found by id in O(1) however large its day is, without relying on
+    its index attribute.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, task_id):
+        return task_id in self._entries
+
+    def add(self, task, day_index, position):
+        """
+        Records that task sits at a position of a day, replacing any earlier entry for its id.
+        """
+        self._entries[task.getId()] = (task, day_index, position)
+
+    def remove(self, task_id):
+        """
+        Forgets a task id. Unknown ids are ignored.
+        """
+        self._entries.pop(task_id, None)
+
+    def get(self, task_id):
+        """
+        Returns the task with task_id, or None.
+        """
+        entry = self._entries.get(task_id)
+        return None if entry is None else entry[0]
+
+    def locate(self, task_id):
+        """
+        Returns the (day index, position) of the task with task_id.
+
+        Raises:
+            KeyError: If no task has task_id.
+        """
+        entry = self._entries[task_id]
+        return entry[1], entry[2]
+
+    def rebuild(self, week):
+        """
+        Re-indexes every task of seven per-day task lists, skipping None slots.
+        """
+        self._entries = {task.getId(): (task, day_index, position)
+                         for day_index, day_tasks in enumerate(week)
+                         for position, task in enumerate(day_tasks) if task is not None}
+
+
+class SortedSlots:
+    """
+    Sorted multiset of slots, kept as a list of sorted runs of at most RUN_MAX slots.
+
+    Adding or removing a slot finds its run by a binary search over the last
+    slot of every run and then shifts at most RUN_MAX entries within that
+    run, where one sorted list would shift up to the whole day. Iterating
+    chains the runs, so the slots still come out in order at list speed.
+    """
+
+    def __init__(self):
+        self._runs = []
+        self._lasts = []
+
+    def __iter__(self):
+        return chain.from_iterable(self._runs)
+
+    def add(self, slot):
+        """
+        Inserts a slot in order.
+        """
+        runs, lasts = self._runs, self._lasts
+        if not runs:
+            runs.append([slot])
+            lasts.append(slot)
+            return
+        index = bisect_left(lasts, slot)
+        if index == len(runs):
+            # Past every run; appending a new last slot is the common case.
+            index -= 1
+            runs[index].append(slot)
+            lasts[index] = slot
+        else:
+            insort(runs[index], slot)
+        run = runs[index]
+        if len(run) > RUN_MAX:
+            half = len(run) // 2
+            runs.insert(index + 1, run[half:])
+            lasts.insert(index, run[half - 1])
+            del run[half:]
+
+    def remove(self, slot):
+        """
+        Removes one occurrence of a slot that was added.
+        """
+        runs, lasts = self._runs, self._lasts
+        index = bisect_left(lasts, slot)
+        run = runs[index]
+        del run[bisect_left(run, slot)]
+        if run:
+            lasts[index] = run[-1]
+        else:
+            del runs[index]
+            del lasts[index]
+
+
+class PriorityIndex:
+    """
+    Keeps the slots of every day split into urgent and other tasks, each group in slot order.
+
+    The task store updates it whenever a task is added, replaced, has its
+    priority changed or is deleted. Each group is a SortedSlots, so an update
+    is a binary search plus a shift bounded by RUN_MAX however large the day
+    is, and an "urgent first" day view or the week's urgent tasks are read
+    off in order instead of being sorted on every display. The priority seen
+    by the last update is kept per task id, so a task whose priority was
+    changed in place is moved out of the right group when it is put back.
+    """
+
+    def __init__(self):
+        self._groups = {}
+        self._entries = {}
+
+    def add(self, task, day_index, slot):
+        """
+        Records the priority of the task at a slot of a day, replacing any earlier entry for its id.
+        """
+        self.remove(task.getId())
+        urgent = task.getPriority() == URGENT
+        self._groups.setdefault((day_index, urgent), SortedSlots()).add(slot)
+        self._entries[task.getId()] = (day_index, slot, urgent)
+
+    def remove(self, task_id):
+        """
+        Forgets a task id. Unknown ids are ignored.
+        """
+        entry = self._entries.pop(task_id, None)
+        if entry is None:
+            return
+        day_index, slot, urgent = entry
+        self._groups[(day_index, urgent)].remove(slot)
+
+    def slots(self, day_index, urgent):
+        """
+        Returns the slots of a day holding urgent, or other, tasks in slot order.
+        """
+        group = self._groups.get((day_index, urgent))
+        return list(group) if group is not None else []
+
+    def urgent_first(self, day_index):
+        """
+        Returns every slot of a day, the urgent ones first, each group in slot order.
+        """
+        return self.slots(day_index, True) + self.slots(day_index, False)
+
+    def rebuild(self, week):
+        """
+        Re-indexes every task of seven per-day task lists, skipping None slots.
+        """
+        self._groups = {}
+        self._entries = {}
+        for day_index, day_tasks in enumerate(week):
+            for slot, task in enumerate(day_tasks):
+                if task is not None:
+                    self.add(task, day_index, slot)
+
+
+class LiveSlots:
+    """
+    Fenwick tree over the slots of one day, counting which of them still hold a task.
+
+    Once a day has tombstones, a slot and the live position of its task no
+    longer match. The tree turns one into the other in O(log n): position
+    sums the live slots before a slot and slot walks down the tree to the
+    slot of the n-th live task. Appending a slot and marking one dead are
+    O(log n) as well, so positional reads stay fast however many tombstones a
+    day holds before it is purged.
+    """
+
+    def __init__(self, live=()):
+        """
+        Args:
+            live (iterable): Whether each slot of the day holds a task, first slot first.
+        """
+        tree = [0]
+        tree.extend(1 if alive else 0 for alive in live)
+        for node in range(1, len(tree)):
+            parent = node + (node & -node)
+            if parent < len(tree):
+                tree[parent] += tree[node]
+        self._tree = tree
+
+    def __len__(self):
+        return len(self._tree) - 1
+
+    def append(self, alive=True):
+        """
+        Adds a slot after the last one.
+        """
+        tree = self._tree
+        node = len(tree)
+        # Node n sums the slots after n - lowbit(n) up to n: its own slot plus the nodes that end below it.
+        total = 1 if alive else 0
+        child = node - 1
+        low = node - (node & -node)
+        while child > low:
+            total += tree[child]
+            child -= child & -child
+        tree.append(total)
+
+    def kill(self, slot):
+        """
+        Marks a slot as no longer holding a task.
+        """
+        tree = self._tree
+        node = slot + 1
+        while node < len(tree):
+            tree[node] -= 1
+            node += node & -node
+
+    def position(self, slot):
+        """
+        Returns the number of live slots before a slot, which is the live position of its task.
+        """
+        tree = self._tree
+        total = 0
+        while slot > 0:
+            total += tree[slot]
+            slot -= slot & -slot
+        return total
+
+    def slot(self, position):
+        """
+        Returns the slot of the live task at a position.
+
+        Raises:
+            IndexError: If the day has no live task at position.
+        """
+        if position < 0:
+            raise IndexError('Task position out of range')
+        tree = self._tree
+        node = 0
+        remaining = position + 1
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            child = node + step
+            if child < len(tree) and tree[child] < remaining:
+                node = child
+                remaining -= tree[child]
+            step >>= 1
+        if node >= len(tree) - 1:
+            raise IndexError('Task position out of range')
+        return node
@@ -0,0 +1,348 @@
+import sqlite3
+
+from task import WEEK_DAYS
+from task_index import URGENT, LiveSlots
+from task_stats import CompletionStats
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    belong_week INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    task_index INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_week_position ON tasks (belong_week, position);
+CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks (priority, belong_week, position);
+'''
+
+FTS_SCHEMA = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(content, content='tasks', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+    INSERT INTO tasks_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+    INSERT INTO tasks_fts (tasks_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF content ON tasks BEGIN
+    INSERT INTO tasks_fts (tasks_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    INSERT INTO tasks_fts (rowid, content) VALUES (new.id, new.content);
+END;
+'''
+
+TASK_COLUMNS = 'belong_week, task_index, content, priority, id, completed'
+
+
+class SqliteTaskRepository:
+    """
+    Task repository backed by SQLite, with the same interface as task_store.TaskStore.
+
+    Tasks live in one table addressed by (belong_week, position), which is a
+    unique index, so per-day listing and positional lookup are index range
+    scans instead of Python list walks. A second index serves priority
+    queries and an FTS5 table, kept in sync by triggers, serves content
+    search. When the SQLite build has no FTS5, search falls back to LIKE.
+    The position column only orders a day: a deleted row leaves a gap rather
+    than renumbering the rest of the day, and a LiveSlots tree per day turns
+    the positions callers see into stored ones and back in O(log n). compact
+    closes the gaps of days with more gaps than tasks. New databases never
+    reuse a task id. The
+    priority index also serves urgent-first day views and the week's urgent
+    tasks, as ordered range scans. Completion counters are read from the
+    table once on open and then kept current by every change made through
+    the repository, so they never cost a query.
+
+    Attributes:
+        path (str): The database file.
+        has_fts (bool): Whether the FTS5 content index is available.
+        stats (CompletionStats): Completion counters per day, per priority and for the week.
+        day_versions (list): Per-day counters bumped by every change made through this repository.
+    """
+
+    def __init__(self, path, task_factory):
+        """
+        Args:
+            path (str): The database file, created if missing.
+            task_factory (callable): Builds a task from (content, index, belong_week, priority, task_id).
+        """
+        self.path = path
+        self.task_factory = task_factory
+        self.has_fts = False
+        self.day_versions = [0] * len(WEEK_DAYS)
+        self.stats = CompletionStats()
+        self._live = [LiveSlots() for _ in WEEK_DAYS]
+        self._connection = None
+        self._new = True
+
+    def open(self):
+        """
+        Opens the database, creates the schema and indexes if needed and counts the completed tasks.
+        """
+        self._connection = sqlite3.connect(self.path)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._new = self._connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tasks'").fetchone() is None
+        with self._connection:
+            self._connection.executescript(SCHEMA)
+            columns = [row[1] for row in self._connection.execute('PRAGMA table_info(tasks)')]
+            if 'completed' not in columns:
+                # Databases created before tasks had a completion status.
+                self._connection.execute('ALTER TABLE tasks ADD COLUMN completed INTEGER NOT NULL DEFAULT 0')
+            try:
+                self._connection.executescript(FTS_SCHEMA)
+                self.has_fts = True
+            except sqlite3.OperationalError:
+                self.has_fts = False
+        slots = [[] for _ in WEEK_DAYS]
+        for task_id, belong_week, position, priority, completed in self._connection.execute(
+                'SELECT id, belong_week, position, priority, completed FROM tasks ORDER BY belong_week, position'):
+            self.stats.record(task_id, belong_week, priority, bool(completed))
+            day_slots = slots[belong_week]
+            day_slots.extend([False] * (position - len(day_slots)))
+            day_slots.append(True)
+        self._live = [LiveSlots(day_slots) for day_slots in slots]
+        return self
+
+    def is_new(self):
+        """
+        Returns True if the tasks table did not exist before the repository was opened.
+        """
+        return self._new
+
+    def append(self, day_index, task):
+        """
+        Adds a task at the end of a day. A task without an id gets the new row id as its stable id.
+        """
+        live = self._live[day_index]
+        with self._connection:
+            cursor = self._connection.execute(
+                'INSERT INTO tasks (id, belong_week, position, task_index, content, priority, completed) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (task.getId(), day_index, len(live), task.getIndex(), task.getContent(), task.getPriority(),
+                 int(task.isCompleted())))
+        live.append()
+        task.setId(cursor.lastrowid)
+        self.stats.add(task, day_index)
+        self.day_versions[day_index] += 1
+        self._new = False
+        return task
+
+    def put(self, day_index, position, task):
+        """
+        Replaces the task at a position of a day. The row, and so the task id, is kept.
+        """
+        slot = self._slot(day_index, position)
+        if task.getId() is None:
+            row = self._connection.execute('SELECT id FROM tasks WHERE belong_week = ? AND position = ?',
+                                           (day_index, slot)).fetchone()
+            if row is not None:
+                task.setId(row[0])
+        with self._connection:
+            self._connection.execute(
+                'UPDATE tasks SET task_index = ?, content = ?, priority = ?, completed = ? '
+                'WHERE belong_week = ? AND position = ?',
+                (task.getIndex(), task.getContent(), task.getPriority(), int(task.isCompleted()),
+                 day_index, slot))
+        self.stats.add(task, day_index)
+        self.day_versions[day_index] += 1
+        return task
+
+    def set_priority(self, day_index, position, priority):
+        """
+        Changes the priority of the task at a position of a day.
+        """
+        with self._connection:
+            self._connection.execute('UPDATE tasks SET priority = ? WHERE belong_week = ? AND position = ?',
+                                     (priority, day_index, self._slot(day_index, position)))
+        self.day_versions[day_index] += 1
+        task = self.task_at(day_index, position)
+        self.stats.add(task, day_index)
+        return task
+
+    def complete(self, day_index, position, completed=True):
+        """
+        Marks the task at a position of a day as completed, or as not completed with completed=False.
+        """
+        with self._connection:
+            self._connection.execute('UPDATE tasks SET completed = ? WHERE belong_week = ? AND position = ?',
+                                     (int(completed), day_index, self._slot(day_index, position)))
+        self.day_versions[day_index] += 1
+        task = self.task_at(day_index, position)
+        self.stats.add(task, day_index)
+        return task
+
+    def delete(self, day_index, position):
+        """
+        Removes the task at a position of a day and returns it. Later tasks of the day move up one position.
+        """
+        slot = self._slot(day_index, position)
+        task = self.task_at(day_index, position)
+        with self._connection:
+            self._connection.execute('DELETE FROM tasks WHERE id = ?', (task.getId(),))
+        self._live[day_index].kill(slot)
+        self.stats.remove(task.getId())
+        self.day_versions[day_index] += 1
+        return task
+
+    def position_of(self, day_index, task):
+        """
+        Returns the position of a task within its day, by id or else by the newest task with the same fields.
+        """
+        if task.getId() is not None:
+            row = self._connection.execute('SELECT position FROM tasks WHERE id = ? AND belong_week = ?',
+                                           (task.getId(), day_index)).fetchone()
+            if row is not None:
+                return self._live[day_index].position(row[0])
+        row = self._connection.execute(
+            'SELECT position FROM tasks WHERE belong_week = ? AND task_index = ? AND content = ? AND priority = ? '
+            'ORDER BY position DESC LIMIT 1',
+            (day_index, task.getIndex(), task.getContent(), task.getPriority())).fetchone()
+        if row is None:
+            raise ValueError('Task is not in the store')
+        return self._live[day_index].position(row[0])
+
+    def task_by_id(self, task_id):
+        """
+        Returns the task with a stable id, or None.
+        """
+        row = self._connection.execute(f'SELECT {TASK_COLUMNS} FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        return None if row is None else self._build(row)
+
+    def locate(self, task_id):
+        """
+        Returns the (day index, position) of the task with a stable id.
+
+        Raises:
+            KeyError: If no task has task_id.
+        """
+        row = self._connection.execute('SELECT belong_week, position FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        if row is None:
+            raise KeyError(task_id)
+        return row[0], self._live[row[0]].position(row[1])
+
+    def day_version(self, day_index):
+        """
+        Returns a counter that changes whenever a task of the day is added or changed.
+        """
+        return self.day_versions[day_index]
+
+    def tasks_for_day(self, day_index):
+        """
+        Returns the tasks of a day in position order.
+        """
+        rows = self._connection.execute(
+            f'SELECT {TASK_COLUMNS} FROM tasks WHERE belong_week = ? ORDER BY position', (day_index,))
+        return [self._build(row) for row in rows]
+
+    def task_at(self, day_index, position):
+        """
+        Returns the task at a position of a day.
+        """
+        row = self._connection.execute(
+            f'SELECT {TASK_COLUMNS} FROM tasks WHERE belong_week = ? AND position = ?',
+            (day_index, self._slot(day_index, position))).fetchone()
+        if row is None:
+            raise IndexError('No task at this position')
+        return self._build(row)
+
+    def count_for_day(self, day_index):
+        """
+        Returns the number of tasks of a day, the live slots of its tree, without a query.
+        """
+        live = self._live[day_index]
+        return live.position(len(live))
+
+    def tasks_with_priority(self, priority):
+        """
+        Returns every task with a priority, in week and position order.
+        """
+        rows = self._connection.execute(
+            f'SELECT {TASK_COLUMNS} FROM tasks WHERE priority = ? ORDER BY belong_week, position', (priority,))
+        return [self._build(row) for row in rows]
+
+    def tasks_urgent_first(self, day_index):
+        """
+        Returns the tasks of a day, urgent tasks first, each group in position order.
+
+        Returns:
+            tuple: The list of positions of the tasks and the list of the tasks, in the same order.
+        """
+        rows = self._connection.execute(
+            f'SELECT position, {TASK_COLUMNS} FROM tasks WHERE priority = ? AND belong_week = ? ORDER BY position',
+            (URGENT, day_index)).fetchall()
+        rows += self._connection.execute(
+            f'SELECT position, {TASK_COLUMNS} FROM tasks WHERE belong_week = ? AND priority != ? ORDER BY position',
+            (day_index, URGENT)).fetchall()
+        live = self._live[day_index]
+        return [live.position(row[0]) for row in rows], [self._build(row[1:]) for row in rows]
+
+    def urgent_tasks(self):
+        """
+        Returns (day index, position, task) for every urgent task of the week, in week and position order.
+        """
+        rows = self._connection.execute(
+            f'SELECT belong_week, position, {TASK_COLUMNS} FROM tasks WHERE priority = ? '
+            'ORDER BY belong_week, position', (URGENT,))
+        return [(row[0], self._live[row[0]].position(row[1]), self._build(row[2:])) for row in rows]
+
+    def search(self, text):
+        """
+        Returns every task whose content contains the words of text as a phrase, in week and position order.
+        """
+        if self.has_fts:
+            phrase = '"' + text.replace('"', '""') + '"'
+            rows = self._connection.execute(
+                f'SELECT {TASK_COLUMNS} FROM tasks WHERE id IN '
+                '(SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH ?) ORDER BY belong_week, position',
+                (phrase,))
+        else:
+            rows = self._connection.execute(
+                f"SELECT {TASK_COLUMNS} FROM tasks WHERE content LIKE ? ESCAPE '\\' "
+                'ORDER BY belong_week, position',
+                ('%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%',))
+        return [self._build(row) for row in rows]
+
+    def compact(self):
+        """
+        Closes the position gaps of days that have more gaps than tasks and checkpoints the SQLite journal.
+        """
+        for day_index in range(len(WEEK_DAYS)):
+            live = self._live[day_index]
+            if len(live) > 2 * live.position(len(live)):
+                self._purge(day_index)
+        self._connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close(self):
+        """
+        Closes the database. Safe to call more than once.
+        """
+        if self._connection is None:
+            return
+        self.compact()
+        self._connection.close()
+        self._connection = None
+
+    def _purge(self, day_index):
+        ids = [row[0] for row in self._connection.execute(
+            'SELECT id FROM tasks WHERE belong_week = ? ORDER BY position', (day_index,))]
+        with self._connection:
+            # Renumber through negative positions so the unique (belong_week, position) index never sees a duplicate.
+            self._connection.executemany('UPDATE tasks SET position = ? WHERE id = ?',
+                                         ((-1 - position, task_id) for position, task_id in enumerate(ids)))
+            self._connection.execute('UPDATE tasks SET position = -position - 1 WHERE belong_week = ? AND position < 0',
+                                     (day_index,))
+        self._live[day_index] = LiveSlots([True] * len(ids))
+
+    def _slot(self, day_index, position):
+        # Stored position of the task at a position of a day.
+        return self._live[day_index].slot(position)
+
+    def _build(self, row):
+        belong_week, task_index, content, priority, task_id, completed = row
+        task = self.task_factory(content, task_index, WEEK_DAYS[belong_week], priority, task_id)
+        if completed:
+            task.setCompleted(True)
+        return task
@@ -0,0 +1,100 @@
+from collections import Counter
+
+from task import WEEK_DAYS
+
+
+class CompletionStats:
+    """
+    Completion counters of the week's tasks, per day, per priority and for the whole week.
+
+    Every task adds one to four totals, those of (day, priority), (day, any
+    priority), (any day, priority) and the week, and to the same four
+    completed counters when it is done, so every count and rate is a
+    dictionary lookup. The task stores call add on every add, edit, priority
+    change and completion and remove on every delete; each call moves one
+    task between counters in O(1) however large the week is. The day,
+    priority and status last counted are kept per task id, which is what lets
+    a task changed in place be taken out of the right counters again.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._totals = Counter()
+        self._completed = Counter()
+
+    def add(self, task, day_index):
+        """
+        Counts a task under a day, replacing whatever was counted for its id before.
+        """
+        self.record(task.getId(), day_index, task.getPriority(), task.isCompleted())
+
+    def record(self, task_id, day_index, priority, completed):
+        """
+        Counts the task with an id under a day, priority and completion status.
+        """
+        self.remove(task_id)
+        self._entries[task_id] = (day_index, priority, completed)
+        self._count(day_index, priority, completed, 1)
+
+    def remove(self, task_id):
+        """
+        Stops counting the task with an id. Unknown ids are ignored.
+        """
+        entry = self._entries.pop(task_id, None)
+        if entry is not None:
+            self._count(*entry, -1)
+
+    def rebuild(self, week):
+        """
+        Counts every task of a week given as seven lists of tasks, None entries being skipped.
+        """
+        self._entries.clear()
+        self._totals.clear()
+        self._completed.clear()
+        for day_index, day_tasks in enumerate(week):
+            for task in day_tasks:
+                if task is not None:
+                    self.add(task, day_index)
+
+    def counts(self, day_index=None, priority=None):
+        """
+        Returns (completed, total) of the tasks of a day and priority; None stands for every day or priority.
+        """
+        key = (day_index, priority)
+        return self._completed[key], self._totals[key]
+
+    def rate(self, day_index=None, priority=None):
+        """
+        Returns the fraction of the tasks of a day and priority that are completed, 0.0 when there are none.
+        """
+        completed, total = self.counts(day_index, priority)
+        return completed / total if total else 0.0
+
+    def priorities(self):
+        """
+        Returns every priority that has tasks, sorted.
+        """
+        return sorted(priority for day_index, priority in self._totals
+                      if day_index is None and priority is not None and self._totals[(None, priority)])
+
+    def summary(self):
+        """
+        Returns the completed count, total and rate of the week, of every day and of every priority.
+
+        Returns:
+            dict: 'week' maps to one {'completed', 'total', 'rate'} dictionary, 'days' to seven of them,
+            Monday first, and 'priorities' to one per priority that has tasks.
+        """
+        return {'week': self._summarize(None, None),
+                'days': [self._summarize(day_index, None) for day_index in range(len(WEEK_DAYS))],
+                'priorities': {priority: self._summarize(None, priority) for priority in self.priorities()}}
+
+    def _summarize(self, day_index, priority):
+        completed, total = self.counts(day_index, priority)
+        return {'completed': completed, 'total': total, 'rate': completed / total if total else 0.0}
+
+    def _count(self, day_index, priority, completed, amount):
+        for key in ((day_index, priority), (day_index, None), (None, priority), (None, None)):
+            self._totals[key] += amount
+            if completed:
+                self._completed[key] += amount
@@ -0,0 +1,450 @@
+import json
+import os
+
+from task import WEEK_DAYS
+from task_index import URGENT, LiveSlots, PriorityIndex, TaskIndex
+from task_stats import CompletionStats
+
+SNAPSHOT_FILE = 'snapshot.json'
+WAL_FILE = 'tasks.wal'
+
+# A day's tombstones are purged once there are more than this many and they make up over a quarter of its slots.
+# Positional reads do not depend on it, see LiveSlots; it bounds the memory held by dead slots.
+TOMBSTONE_MIN = 16
+
+
+class TaskStore:
+    """
+    Durable weekly task store backed by a snapshot file and an append-only write-ahead log.
+
+    The in-memory state is a list of seven per-day task lists, in the same
+    shape as main.weekTaskList. Every mutation is applied in memory and
+    appended to the log as one JSON line, so a write costs O(1) no matter how
+    large the schedule is. Once the log holds snapshot_every records it is
+    folded into a fresh snapshot and truncated. Opening the store loads the
+    snapshot and replays the log on top of it. Every compaction bumps a
+    generation number kept in the snapshot and written as the first line of
+    the new log, so a log left behind by a crash between replacing the
+    snapshot and truncating the log, whose records the snapshot already
+    holds, is recognised by its older generation and not replayed. Each task is given a stable id
+    on append that survives replacement, restarts and compaction, and a
+    TaskIndex finds any task by that id in O(1). Ids are never reused. A
+    PriorityIndex, updated along with it, serves urgent-first day views and
+    the week's urgent tasks without sorting, and a CompletionStats keeps the
+    completion counters of the week current on every change.
+
+    Deleting a task leaves a tombstone (None) in its slot, so a delete does
+    not shift the rest of the day. Reads skip tombstones and positions passed
+    to and returned by the store count live tasks only; a LiveSlots tree per
+    day maps between positions and slots in O(log n) while a day has
+    tombstones. A day is purged of its tombstones once they pass
+    TOMBSTONE_MIN and a quarter of its slots, and compaction drops them all,
+    so dead slots never pile up.
+
+    Attributes:
+        directory (str): Folder holding the snapshot and the log.
+        week (list): Seven lists of task slots, Monday first; None marks a deleted task.
+        index (TaskIndex): Every task by id.
+        priorities (PriorityIndex): Every task slot grouped by urgency.
+        stats (CompletionStats): Completion counters per day, per priority and for the week.
+        day_versions (list): Per-day counters bumped by every change to a day, for caches of day views.
+        snapshot_every (int): Log records that trigger a compaction.
+        sync_writes (bool): fsync every log record instead of only flushing it.
+    """
+
+    def __init__(self, directory, task_factory, snapshot_every=1000, sync_writes=False):
+        """
+        Args:
+            directory (str): Folder holding the snapshot and the log, created if missing.
+            task_factory (callable): Builds a task from (content, index, belong_week, priority, task_id).
+            snapshot_every (int): Log records that trigger a compaction.
+            sync_writes (bool): fsync every log record instead of only flushing it.
+        """
+        self.directory = directory
+        self.task_factory = task_factory
+        self.snapshot_every = snapshot_every
+        self.sync_writes = sync_writes
+        self.week = [[] for _ in WEEK_DAYS]
+        self.index = TaskIndex()
+        self.priorities = PriorityIndex()
+        self.stats = CompletionStats()
+        self._tombstones = [0] * len(WEEK_DAYS)
+        self._live = [LiveSlots() for _ in WEEK_DAYS]
+        self.day_versions = [0] * len(WEEK_DAYS)
+        self._snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self._wal_path = os.path.join(directory, WAL_FILE)
+        self._wal = None
+        self._wal_records = 0
+        self._new = True
+        self._next_id = 1
+        self._generation = 0
+
+    def open(self):
+        """
+        Loads the snapshot, replays the log and opens the log for appending.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self._snapshot_path):
+            self._new = False
+            with open(self._snapshot_path, encoding='utf-8') as snapshot:
+                data = json.load(snapshot)
+            self.week = [[self._build(day, record) for record in day_records]
+                         for day, day_records in enumerate(data['week'])]
+            self._next_id = max(self._next_id, data.get('next_id', 1))
+            self._generation = data.get('generation', 0)
+        torn = stale = False
+        wal_generation = None
+        if os.path.exists(self._wal_path):
+            with open(self._wal_path, encoding='utf-8') as wal:
+                for line in wal:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-write; everything before it is intact.
+                        torn = True
+                        break
+                    if wal_generation is None:
+                        # Logs written before compactions were numbered have no header and belong to generation 0.
+                        header = 'op' not in entry
+                        wal_generation = entry['generation'] if header else 0
+                        if wal_generation != self._generation:
+                            # The snapshot was replaced but the log it folded in was never truncated.
+                            stale = True
+                            break
+                        if header:
+                            continue
+                    self._apply(entry)
+                    self._wal_records += 1
+                    self._new = False
+        self.index.rebuild(self.week)
+        self.priorities.rebuild(self.week)
+        self.stats.rebuild(self.week)
+        self._live = [LiveSlots(task is not None for task in day_tasks) for day_tasks in self.week]
+        if torn or stale:
+            self.compact()
+        elif wal_generation is None:
+            self._start_wal()
+        else:
+            self._wal = open(self._wal_path, 'a', encoding='utf-8')
+        return self
+
+    def is_new(self):
+        """
+        Returns True if neither a snapshot nor any log record existed when the store was opened.
+        """
+        return self._new
+
+    def append(self, day_index, task):
+        """
+        Adds a task at the end of a day, giving it a stable id if it has none.
+        """
+        self._assign_id(task)
+        self._log({'op': 'add', 'day': day_index, 'task': self._record(task)})
+        self.week[day_index].append(task)
+        self._live[day_index].append()
+        self.index.add(task, day_index, len(self.week[day_index]) - 1)
+        self.priorities.add(task, day_index, len(self.week[day_index]) - 1)
+        self.stats.add(task, day_index)
+        self.day_versions[day_index] += 1
+        self._maybe_compact()
+        return task
+
+    def put(self, day_index, position, task):
+        """
+        Replaces the task at a position of a day. The replacement keeps the id of the old task.
+        """
+        slot = self._slot(day_index, position)
+        replaced = self.week[day_index][slot]
+        if task.getId() is None:
+            task.setId(replaced.getId())
+        self._log({'op': 'put', 'day': day_index, 'pos': slot, 'task': self._record(task)})
+        self.week[day_index][slot] = task
+        if replaced.getId() != task.getId():
+            self.index.remove(replaced.getId())
+            self.priorities.remove(replaced.getId())
+            self.stats.remove(replaced.getId())
+        self.index.add(task, day_index, slot)
+        self.priorities.add(task, day_index, slot)
+        self.stats.add(task, day_index)
+        self.day_versions[day_index] += 1
+        self._maybe_compact()
+        return task
+
+    def set_priority(self, day_index, position, priority):
+        """
+        Changes the priority of the task at a position of a day.
+        """
+        slot = self._slot(day_index, position)
+        self._log({'op': 'priority', 'day': day_index, 'pos': slot, 'priority': priority})
+        task = self.week[day_index][slot]
+        task.setPriority(priority)
+        self.priorities.add(task, day_index, slot)
+        self.stats.add(task, day_index)
+        self.day_versions[day_index] += 1
+        self._maybe_compact()
+        return task
+
+    def complete(self, day_index, position, completed=True):
+        """
+        Marks the task at a position of a day as completed, or as not completed with completed=False.
+        """
+        slot = self._slot(day_index, position)
+        self._log({'op': 'complete', 'day': day_index, 'pos': slot, 'completed': completed})
+        task = self.week[day_index][slot]
+        task.setCompleted(completed)
+        self.stats.add(task, day_index)
+        self.day_versions[day_index] += 1
+        self._maybe_compact()
+        return task
+
+    def delete(self, day_index, position):
+        """
+        Removes the task at a position of a day and returns it. Later tasks of the day move up one position.
+        """
+        slot = self._slot(day_index, position)
+        task = self.week[day_index][slot]
+        self._log({'op': 'delete', 'day': day_index, 'pos': slot})
+        self.week[day_index][slot] = None
+        self._tombstones[day_index] += 1
+        self._live[day_index].kill(slot)
+        self.index.remove(task.getId())
+        self.priorities.remove(task.getId())
+        self.stats.remove(task.getId())
+        self.day_versions[day_index] += 1
+        self._maybe_purge(day_index)
+        self._maybe_compact()
+        return task
+
+    def position_of(self, day_index, task):
+        """
+        Returns the position of a task object within its day, looked up by id when it has one.
+        """
+        if task.getId() in self.index:
+            found_day, slot = self.index.locate(task.getId())
+            if found_day == day_index:
+                return self._live_position(day_index, slot)
+        day_tasks = self.week[day_index]
+        for slot in range(len(day_tasks) - 1, -1, -1):
+            if day_tasks[slot] is task:
+                return self._live_position(day_index, slot)
+        raise ValueError('Task is not in the store')
+
+    def task_by_id(self, task_id):
+        """
+        Returns the task with a stable id, or None.
+        """
+        return self.index.get(task_id)
+
+    def locate(self, task_id):
+        """
+        Returns the (day index, position) of the task with a stable id.
+
+        Raises:
+            KeyError: If no task has task_id.
+        """
+        day_index, slot = self.index.locate(task_id)
+        return day_index, self._live_position(day_index, slot)
+
+    def day_version(self, day_index):
+        """
+        Returns a counter that changes whenever a task of the day is added or changed.
+        """
+        return self.day_versions[day_index]
+
+    def tasks_for_day(self, day_index):
+        """
+        Returns the tasks of a day in position order.
+        """
+        if not self._tombstones[day_index]:
+            return self.week[day_index]
+        return [task for task in self.week[day_index] if task is not None]
+
+    def task_at(self, day_index, position):
+        """
+        Returns the task at a position of a day.
+        """
+        return self.week[day_index][self._slot(day_index, position)]
+
+    def count_for_day(self, day_index):
+        """
+        Returns the number of tasks of a day.
+        """
+        return len(self.week[day_index]) - self._tombstones[day_index]
+
+    def tasks_with_priority(self, priority):
+        """
+        Returns every task with a priority, in week and position order.
+        """
+        if priority == URGENT:
+            return [task for _, _, task in self.urgent_tasks()]
+        return [task for day_tasks in self.week for task in day_tasks
+                if task is not None and task.getPriority() == priority]
+
+    def tasks_urgent_first(self, day_index):
+        """
+        Returns the tasks of a day, urgent tasks first, each group in position order.
+
+        Returns:
+            tuple: The list of positions of the tasks and the list of the tasks, in the same order.
+        """
+        day_tasks = self.week[day_index]
+        slots = self.priorities.urgent_first(day_index)
+        if not self._tombstones[day_index]:
+            return slots, [day_tasks[slot] for slot in slots]
+        positions = self._live_positions(day_index)
+        return [positions[slot] for slot in slots], [day_tasks[slot] for slot in slots]
+
+    def urgent_tasks(self):
+        """
+        Returns (day index, position, task) for every urgent task of the week, in week and position order.
+        """
+        urgent = []
+        for day_index, day_tasks in enumerate(self.week):
+            slots = self.priorities.slots(day_index, True)
+            if slots:
+                positions = self._live_positions(day_index)
+                urgent.extend((day_index, positions[slot], day_tasks[slot]) for slot in slots)
+        return urgent
+
+    def search(self, text):
+        """
+        Returns every task whose content contains text, in week and position order.
+        """
+        return [task for day_tasks in self.week for task in day_tasks
+                if task is not None and text in task.getContent()]
+
+    def compact(self):
+        """
+        Writes the current state to a new snapshot, dropping tombstones, and starts a new log generation.
+        """
+        for day_index in range(len(self.week)):
+            self._purge(day_index)
+        self._generation += 1
+        data = {'version': 1, 'next_id': self._next_id, 'generation': self._generation,
+                'week': [[self._record(task) for task in day_tasks] for day_tasks in self.week]}
+        temp_path = self._snapshot_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as snapshot:
+            json.dump(data, snapshot)
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(temp_path, self._snapshot_path)
+        self._start_wal()
+        self._new = False
+
+    def close(self):
+        """
+        Compacts pending log records into the snapshot and closes the log. Safe to call more than once.
+        """
+        if self._wal is None:
+            return
+        if self._wal_records:
+            self.compact()
+        self._wal.close()
+        self._wal = None
+
+    def _start_wal(self):
+        # Truncates the log down to the header naming the snapshot generation its records apply to.
+        if self._wal is not None:
+            self._wal.close()
+        self._wal = open(self._wal_path, 'w', encoding='utf-8')
+        self._wal.write(json.dumps({'generation': self._generation}) + '\n')
+        self._wal.flush()
+        os.fsync(self._wal.fileno())
+        self._wal_records = 0
+
+    def _log(self, entry):
+        self._wal.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self._wal.flush()
+        if self.sync_writes:
+            os.fsync(self._wal.fileno())
+        self._wal_records += 1
+        self._new = False
+
+    def _maybe_compact(self):
+        if self._wal_records >= self.snapshot_every:
+            self.compact()
+
+    def _maybe_purge(self, day_index):
+        tombstones = self._tombstones[day_index]
+        if tombstones > TOMBSTONE_MIN and tombstones * 4 > len(self.week[day_index]):
+            self._log({'op': 'purge', 'day': day_index})
+            self._purge(day_index)
+
+    def _purge(self, day_index):
+        if not self._tombstones[day_index]:
+            return
+        self.week[day_index] = [task for task in self.week[day_index] if task is not None]
+        self._tombstones[day_index] = 0
+        self._live[day_index] = LiveSlots([True] * len(self.week[day_index]))
+        for slot, task in enumerate(self.week[day_index]):
+            self.index.add(task, day_index, slot)
+            self.priorities.add(task, day_index, slot)
+
+    def _slot(self, day_index, position):
+        # Slot in week[day_index] of the live task at position.
+        if position < 0:
+            raise IndexError('Task position out of range')
+        if not self._tombstones[day_index]:
+            return position
+        return self._live[day_index].slot(position)
+
+    def _live_position(self, day_index, slot):
+        if not self._tombstones[day_index]:
+            return slot
+        return self._live[day_index].position(slot)
+
+    def _live_positions(self, day_index):
+        # Live position of every slot of a day; tombstone slots get the position of the next live task.
+        if not self._tombstones[day_index]:
+            return range(len(self.week[day_index]))
+        positions = []
+        position = 0
+        for task in self.week[day_index]:
+            positions.append(position)
+            if task is not None:
+                position += 1
+        return positions
+
+    def _apply(self, entry):
+        day = entry['day']
+        if entry['op'] == 'add':
+            self.week[day].append(self._build(day, entry['task']))
+        elif entry['op'] == 'put':
+            task = self._build(day, entry['task'])
+            if len(entry['task']) < 4:
+                task.setId(self.week[day][entry['pos']].getId())
+            self.week[day][entry['pos']] = task
+        elif entry['op'] == 'priority':
+            self.week[day][entry['pos']].setPriority(entry['priority'])
+        elif entry['op'] == 'complete':
+            self.week[day][entry['pos']].setCompleted(entry['completed'])
+        elif entry['op'] == 'delete':
+            self.week[day][entry['pos']] = None
+            self._tombstones[day] += 1
+        elif entry['op'] == 'purge':
+            self._purge(day)
+
+    def _assign_id(self, task):
+        if task.getId() is None:
+            task.setId(self._next_id)
+        self._next_id = max(self._next_id, task.getId() + 1)
+
+    def _build(self, day_index, record):
+        # Records written before tasks had ids hold only content, index and priority; only completed
+        # tasks carry a fifth field.
+        content, index, priority = record[:3]
+        task = self.task_factory(content, index, WEEK_DAYS[day_index], priority,
+                                 record[3] if len(record) > 3 else None)
+        if len(record) > 4 and record[4]:
+            task.setCompleted(True)
+        self._assign_id(task)
+        return task
+
+    @staticmethod
+    def _record(task):
+        record = [task.getContent(), task.getIndex(), task.getPriority(), task.getId()]
+        if task.isCompleted():
+            record.append(True)
+        return record
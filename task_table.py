@@ -0,0 +1,188 @@
+import os
+import threading
+
+from task import Task, task_fields, task_to_dict
+
+
+class UnknownTaskError(KeyError):
+    """
+    Raised when a patch names a task id the server does not hold.
+    """
+
+
+class TaskTable:
+    """
+    Server-side task state keyed by stable task id, with a version per task.
+
+    Clients register a task once with its full record and afterwards send
+    only patches. Every patch that changes something bumps the version and
+    returns just the changed mutable fields, so replies stay the same size
+    however large a task gets. A client whose known version is not the
+    current one is sent every mutable field instead, which brings its copy
+    back in sync. A lock keeps updates atomic when several consumer threads
+    share the table.
+
+    Versions only mean something within one table, so every table has a
+    random epoch that put replies carry and patches send back. A patch
+    carrying another table's epoch, for example one synced with a remote
+    service and then answered by a local fallback, is treated as naming an
+    unknown task, so the client registers the task again.
+
+    Attributes:
+        epoch (int): Random id of this table instance.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self.epoch = int.from_bytes(os.urandom(4), 'big')
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def get(self, task_id):
+        """
+        Returns the task stored under task_id, or None.
+        """
+        entry = self._tasks.get(task_id)
+        return None if entry is None else entry[0]
+
+    def put(self, task_id, task):
+        """
+        Stores the full record of a task and returns its new version.
+        """
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            version = 1 if entry is None else entry[1] + 1
+            self._tasks[task_id] = [task, version]
+            return version
+
+    def update(self, task_id, mutate, base_version=None):
+        """
+        Applies mutate to a stored task and returns (version, changes).
+
+        Args:
+            task_id (int): The task to change.
+            mutate (callable): Changes the Task object in place.
+            base_version (int): The version the client last saw, or None.
+
+        Returns:
+            tuple: The version after the update and a dictionary of the mutable
+            fields that changed, or of all of them if base_version was stale.
+        """
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            if entry is None:
+                raise UnknownTaskError(task_id)
+            task, version = entry
+            if base_version != version:
+                base_version = None
+            before = task_fields(task)
+            mutate(task)
+            after = task_fields(task)
+            changes = {field: value for field, value in after.items() if before[field] != value}
+            if changes:
+                version += 1
+                entry[1] = version
+        if base_version is None:
+            changes = after
+        return version, changes
+
+    def select(self, predicate, task_ids=None):
+        """
+        Returns the ids of the stored tasks for which predicate is true, among task_ids if given.
+        """
+        with self._lock:
+            if task_ids is None:
+                candidates = list(self._tasks.items())
+            else:
+                candidates = [(task_id, self._tasks[task_id]) for task_id in task_ids if task_id in self._tasks]
+        return [task_id for task_id, (task, _) in candidates if predicate(task)]
+
+    def delete(self, task_id):
+        """
+        Forgets a task. Unknown ids are ignored.
+        """
+        with self._lock:
+            self._tasks.pop(task_id, None)
+
+
+def handle_put(table, request):
+    """
+    Handles a 'put_task' request: stores the task_data record under task_id.
+    """
+    task_data = request['task_data']
+    task_id = request['task_id']
+    task = Task(task_data['content'], task_data['index'], task_data['belong_week'], task_data['priority'], task_id)
+    return {'task_id': task_id, 'version': table.put(task_id, task), 'epoch': table.epoch}
+
+
+def handle_update(table, request, mutate):
+    """
+    Handles a patch request by applying mutate to the task named by task_id.
+
+    Returns the task id, its version and the changed fields, or an
+    'unknown_task' error so the client can register the task and retry. A
+    request whose epoch is not the table's is answered with that error too.
+    """
+    task_id = request['task_id']
+    if request.get('epoch') not in (None, table.epoch):
+        return {'task_id': task_id, 'error': 'unknown_task'}
+    try:
+        version, changes = table.update(task_id, mutate, request.get('version'))
+    except UnknownTaskError:
+        return {'task_id': task_id, 'error': 'unknown_task'}
+    return {'task_id': task_id, 'version': version, 'changes': changes}
+
+
+def handle_update_where(table, request, mutate):
+    """
+    Handles a predicate update: applies mutate to every task whose fields equal those in request['where'].
+
+    Only the tasks listed in request['task_ids'] are considered when it is given, so tasks a client
+    has since deleted are left alone. request['epochs'] may give the epoch the client synced each of
+    them with, None for any; those synced with another table are not matched but answered with an
+    'unknown_task' error, so the client can register them and retry. Returns one handle_update
+    result per matching task.
+    """
+    where = request.get('where', {})
+    task_ids = request.get('task_ids')
+    stale = []
+    if task_ids is not None and request.get('epochs') is not None:
+        stale = [task_id for task_id, epoch in zip(task_ids, request['epochs'])
+                 if epoch is not None and epoch != table.epoch]
+        stale_ids = set(stale)
+        task_ids = [task_id for task_id in task_ids if task_id not in stale_ids]
+    task_ids = table.select(lambda task: all(task_to_dict(task).get(field) == value for field, value in where.items()),
+                            task_ids)
+    return {'results': [{'task_id': task_id, 'error': 'unknown_task'} for task_id in stale]
+            + [handle_update(table, {'task_id': task_id}, mutate) for task_id in task_ids]}
+
+
+def handle_bulk(request, handle_one):
+    """
+    Handles a 'bulk' request: passes every request in request['requests'] to handle_one, in order.
+
+    A failing request yields an error result instead of failing the others.
+    """
+    results = []
+    for one in request['requests']:
+        try:
+            results.append(handle_one(one))
+        except Exception as e:
+            results.append({'task_id': one.get('task_id'), 'error': str(e)})
+    return {'results': results}
+
+
+def handle_delete(table, request):
+    """
+    Handles a 'delete_task' request: forgets the task named by task_id.
+
+    Deleting a task the table does not hold succeeds too, so a retried delete is harmless.
+    """
+    table.delete(request['task_id'])
+    return {'task_id': request['task_id'], 'deleted': True}
+
+
+# Task state held by the services running in this process.
+task_table = TaskTable()
@@ -0,0 +1,81 @@
+import time
+from collections import OrderedDict
+
+
+def validate_string(user_string, string_lower, string_upper):
+    """Returns "Too Small", "Too Big" or "Just Right" for a string and its acceptable length bounds."""
+    count = len(user_string)
+    if count <= string_lower:
+        return "Too Small"
+    elif count >= string_upper:
+        return "Too Big"
+    else:
+        return "Just Right"
+
+
+class ValidationCache:
+    """
+    Bounded memo of StringValidator results keyed by (string, lower, upper).
+
+    Entries are evicted least recently used first once max_entries is reached,
+    and expire ttl seconds after they were stored, so a change of validation
+    rules on the service is picked up without restarting the client.
+
+    Attributes:
+        max_entries (int): The most results kept.
+        ttl (float): Seconds a result stays valid, or None to keep it until evicted.
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that were not cached or had expired.
+        evictions (int): Entries dropped to stay within max_entries.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._clock = clock
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Returns the cached result for key, or None if it is missing or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[1] is not None and entry[1] <= self._clock():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, result):
+        """
+        Stores the result for key, evicting the least recently used entry if the cache is full.
+        """
+        expires = None if self.ttl is None else self._clock() + self.ttl
+        self._entries[key] = (result, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Drops every entry. The counters are kept.
+        """
+        self._entries.clear()
+
+    def stats(self):
+        """
+        Returns the counters and current size as a dictionary.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self._entries)}